@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import multiprocessing as mp
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import generate_task01 as g  # noqa: E402
+
+
+# -----------------------
+# 合成書稿（benchmark 用）
+# - 直接寫最小 WordprocessingML 套件，100 MB 也不用經過 python-docx
+# - size = document 內文字數（bytes，UTF-8），code_ratio = code 段落比例
+# - 同樣參數 + seed 一定產生同一份檔案
+# -----------------------
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+_PACKAGE_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+_TECH_TERMS = [
+    "LangGraph", "NotebookLM", "GitHub", "Cursor", "RAG", "LLM", "API", "FastAPI",
+    "Python-3.11", "node.js", "Next.js", "OpenAI", "Docker", "Kubernetes", "SQLite",
+    "PostgreSQL", "VectorDB", "LangChain", "JSON", "YAML", "CI/CD", "GitHub Actions",
+]
+_PROSE_FILLER = [
+    "今天我們來看看", "這一步的重點是", "你可以把它想成", "實際操作的時候",
+    "先把流程定下來", "再慢慢補上細節", "最後記得檢查輸出", "這樣整個專案就能穩定運作",
+]
+_CODE_LINES = [
+    "const result = await fetch(url);",
+    "if (items.length > 0) { return items[0]; }",
+    "def load(path): return json.loads(path.read_text())",
+    "for (let i = 0; i < n; i++) { total += arr[i]; }",
+    "import { useState } from 'react';",
+    "print(f\"{name}: {value}\")",
+]
+
+
+def _synthetic_paragraph(rng: random.Random, code_ratio: float) -> str:
+    if rng.random() < code_ratio:
+        return " ".join(rng.choice(_CODE_LINES) for _ in range(rng.randint(1, 3)))
+    parts = []
+    for _ in range(rng.randint(3, 8)):
+        parts.append(rng.choice(_PROSE_FILLER))
+        # 前面幾個詞出現得比較多，頻率分布才有高低
+        parts.append(_TECH_TERMS[min(int(rng.expovariate(0.35)), len(_TECH_TERMS) - 1)])
+    return "，".join(parts) + "。"
+
+
+def write_synthetic_docx(path: Path, size_bytes: int, code_ratio: float, seed: int = 0) -> int:
+    rng = random.Random(seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    count = 0
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _PACKAGE_RELS)
+        with zf.open("word/document.xml", "w") as f:
+            f.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+            )
+            while written < size_bytes:
+                text = _synthetic_paragraph(rng, code_ratio)
+                written += len(text.encode("utf-8"))
+                count += 1
+                f.write(f'<w:p><w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>'.encode("utf-8"))
+            f.write(b"<w:sectPr/></w:body></w:document>")
+    return count
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().upper()
+    for suffix, mul in (("KB", 1024), ("MB", 1024 ** 2), ("GB", 1024 ** 3), ("B", 1)):
+        if text.endswith(suffix):
+            return int(float(text[: -len(suffix)]) * mul)
+    return int(text)
+
+
+# -----------------------
+# 單一階段量測
+# - 每個階段在 fork 出來的子 process 跑，peak RSS 才不會被前一個階段墊高
+# - Linux 上先寫 /proc/self/clear_refs 重設 VmHWM，只量這個階段自己的峰值
+# - 其他平台退回 ru_maxrss（會包含 fork 前的基底）
+# -----------------------
+def _measure_child(conn, fn) -> None:
+    try:
+        base = g.proc_status_kb("VmRSS") if g.reset_peak_rss() else None
+        wall0 = time.perf_counter()
+        cpu0 = time.process_time()
+        fn()
+        conn.send({
+            "wall_s": time.perf_counter() - wall0,
+            "cpu_s": time.process_time() - cpu0,
+            "peak_rss_kb": g.peak_rss_kb(),
+            "base_rss_kb": base,
+        })
+    except Exception as e:
+        conn.send({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def measure(fn, repeat: int) -> dict:
+    # 先在父 process 跑一次暖身（regex 編譯、lazy import、各種快取），fork 出來的子 process 直接沿用，
+    # 量到的才是穩定狀態的成本，不會讓某個階段替大家付一次性的初始化
+    fn()
+    ctx = mp.get_context("fork")
+    runs = []
+    for _ in range(repeat):
+        parent, child = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=_measure_child, args=(child, fn))
+        proc.start()
+        child.close()
+        result = parent.recv()
+        proc.join()
+        if "error" in result:
+            return result
+        runs.append(result)
+    # 取最快的一次當代表值，peak RSS 取最大
+    best = min(runs, key=lambda r: r["wall_s"])
+    return {
+        "wall_s": round(best["wall_s"], 6),
+        "cpu_s": round(best["cpu_s"], 6),
+        "peak_rss_kb": max(r["peak_rss_kb"] for r in runs),
+        # 階段本身多用的記憶體（扣掉 fork 時繼承的基底；無法重設峰值的平台為 null）
+        "peak_rss_delta_kb": max(
+            (r["peak_rss_kb"] - r["base_rss_kb"] for r in runs if r["base_rss_kb"] is not None),
+            default=None,
+        ),
+        "runs": len(runs),
+    }
+
+
+# -----------------------
+# 啟動成本（python -X importtime）
+# - 比較 import generate_task01 本身，和 yaml + docx 這兩個重依賴的 import 成本
+# - 另外量 --help 的整體 wall time
+# -----------------------
+_SCRIPTS_DIR = Path(__file__).resolve().parent
+
+
+def _importtime_us(code: str, modules: list[str]) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True,
+    )
+    found = {}
+    for line in proc.stderr.splitlines():
+        # 格式：import time:  self [us] | cumulative | imported package
+        parts = line.split("|")
+        if len(parts) != 3 or not line.startswith("import time:"):
+            continue
+        name = parts[2].strip()
+        if name in modules:
+            try:
+                found[name] = int(parts[1].strip())
+            except ValueError:
+                pass
+    return found
+
+
+def measure_startup(repeat: int) -> dict:
+    gen_code = f"import sys; sys.path.insert(0, {str(_SCRIPTS_DIR)!r}); import generate_task01"
+    heavy = ["yaml", "docx"]
+    gen_runs, heavy_runs, help_runs = [], [], []
+    for _ in range(repeat):
+        gen_runs.append(_importtime_us(gen_code, ["generate_task01"]).get("generate_task01"))
+        heavy_runs.append(sum(_importtime_us("import yaml, docx", heavy).values()))
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, str(_SCRIPTS_DIR / "generate_task01.py"), "--help"],
+                       capture_output=True, check=True)
+        help_runs.append(time.perf_counter() - t0)
+    return {
+        "import_generate_task01_us": min(r for r in gen_runs if r is not None),
+        # 舊版在 module 頂層 import 的 yaml + docx，現在延後到用到的階段
+        "import_yaml_docx_us": min(heavy_runs),
+        "help_wall_s": round(min(help_runs), 6),
+    }
+
+
+# -----------------------
+# 各階段
+# -----------------------
+def _parse_yaml(template_path: Path) -> dict:
+    import yaml
+
+    with template_path.open("r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+def bench_source(template_path: Path, source: Path, outdir: Path, repeat: int) -> dict:
+    template = g.load_template(template_path)
+    paras = g.read_docx_paragraphs(source)
+    prose = [p for p in paras if not g.looks_like_code(p)]
+    prose_text = "\n".join(prose)
+    notes = g.extract_internal_notes(paras)
+    story = g.generate_task01_story(template, notes)
+    out_path = outdir / f"{source.stem}_out.docx"
+    title = template.title
+
+    stages = {
+        "load_template": lambda: g.load_template(template_path),
+        "load_template_yaml": lambda: _parse_yaml(template_path),
+        "read_docx_paragraphs": lambda: g.read_docx_paragraphs(source),
+        "iter_docx_paragraphs": lambda: sum(1 for _ in g.iter_docx_paragraphs(source)),
+        "looks_like_code": lambda: [g.looks_like_code(p) for p in paras],
+        "classify_paragraphs": lambda: g.classify_paragraphs(paras),
+        "extract_terms_from_text": lambda: g.extract_terms_from_text(prose_text, top_k=12),
+        "extract_terms": lambda: g.extract_terms(prose, top_k=12),
+        "generate_task01_story": lambda: g.generate_task01_story(template, notes),
+        "validate_story": lambda: g.validate_story(template, notes, story),
+        "validate_story_fast": lambda: g.validate_story_fast(template, notes, story),
+        "write_docx": lambda: g.write_docx(title, story, out_path),
+        "write_docx_fast": lambda: g.write_docx_fast(title, story, out_path),
+    }
+    return {
+        "counts": {
+            "paragraphs": len(paras),
+            "prose_paragraphs": len(prose),
+            "source_bytes": source.stat().st_size,
+        },
+        "stages": {name: measure(fn, repeat) for name, fn in stages.items()},
+    }
+
+
+# -----------------------
+# 主程式
+# -----------------------
+def main():
+    ap = argparse.ArgumentParser(description="Task01 pipeline benchmark（結果輸出 JSON）")
+    ap.add_argument("--template", default=str(Path(__file__).resolve().parent.parent / "templates" / "task01_v1_1.yml"))
+    ap.add_argument("--sizes", default="1KB,1MB,10MB", help="逗號分隔，例如 1KB,1MB,10MB,100MB")
+    ap.add_argument("--code-ratio", type=float, default=0.2, help="code 段落比例（0~1）")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=3, help="每個階段跑幾次，取最快的一次")
+    ap.add_argument("--workdir", help="合成書稿的存放位置（預設用暫存資料夾，跑完刪掉）")
+    ap.add_argument("--out", help="結果 JSON 輸出路徑（預設印到 stdout）")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(args.workdir) if args.workdir else Path(tmp)
+        results = []
+        for size_text in args.sizes.split(","):
+            size = parse_size(size_text)
+            source = workdir / f"synthetic_{size}_{args.code_ratio}_{args.seed}.docx"
+            if not source.exists():
+                write_synthetic_docx(source, size, args.code_ratio, args.seed)
+            print(f"bench: {size_text.strip()} ({source.stat().st_size} bytes zipped)", file=sys.stderr)
+            results.append({
+                "size": size_text.strip(),
+                "size_bytes": size,
+                "code_ratio": args.code_ratio,
+                **bench_source(Path(args.template), source, workdir / "out", args.repeat),
+            })
+
+    report = {
+        "created_at": dt.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "startup": measure_startup(args.repeat),
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
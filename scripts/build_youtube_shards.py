@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import hashlib
+import json
+import os
+from pathlib import Path
+
+
+# -----------------------
+# 前端用的每家超商分片（data/youtube/）
+# - <slug>.<hash>.json：一家超商的清單，已排好序、已格式化（日期、長度、頻道併成一行 meta）
+#   前端按哪家就只抓哪一份，不用排序也不用再轉格式
+# - 檔名帶內容 hash：內容不變檔名就不變，瀏覽器可以長期快取；內容變了就是新檔名
+# - manifest.json：店家 → 目前的分片檔名 / hash / 筆數，很小，前端每次重新驗證
+# - 內容沒變的分片與 manifest 都不重寫
+# - 上一版 manifest 指到的分片多留一輪：部署前就開著的頁面還拿著舊 manifest，點下去才不會 404；
+#   manifest 有換新時才清掉更舊的分片（內容沒變的重跑不會把上一版也刪掉）
+# -----------------------
+SHARD_FORMAT_VERSION = 1
+STORE_SLUGS = {"7-11": "711", "全家": "familymart", "萊爾富": "hilife"}
+_TAIPEI = dt.timezone(dt.timedelta(hours=8))
+
+
+def store_slug(store: str) -> str:
+    return STORE_SLUGS.get(store) or "store-" + hashlib.sha256(store.encode("utf-8")).hexdigest()[:8]
+
+
+def display_date(published_at: str) -> str:
+    # 與原本前端 toLocaleDateString('zh-TW') 相同的樣子（台灣時間，月日不補零）
+    try:
+        ts = dt.datetime.fromisoformat(published_at.replace("Z", "+00:00")).astimezone(_TAIPEI)
+    except ValueError:
+        return ""
+    return f"{ts.year}/{ts.month}/{ts.day}"
+
+
+def format_video(video: dict) -> dict:
+    parts = [p for p in (display_date(video.get("publishedAt", "")), video.get("duration"), video.get("channel")) if p]
+    return {
+        "title": video.get("title", ""),
+        "url": video.get("url", ""),
+        "meta": f"({'・'.join(parts)})" if parts else "",
+    }
+
+
+def render_shard(store: str, videos: list[dict]) -> bytes:
+    ordered = sorted(videos, key=lambda v: v.get("publishedAt", ""), reverse=True)
+    shard = {"store": store, "videos": [format_video(v) for v in ordered]}
+    return json.dumps(shard, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _write_if_changed(path: Path, data: bytes) -> bool:
+    try:
+        if path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        pass
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    return True
+
+
+def _manifest_files(path: Path) -> set[str]:
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        return {entry["file"] for entry in manifest["stores"].values()}
+    except (FileNotFoundError, ValueError, KeyError, TypeError, AttributeError):
+        return set()
+
+
+def build_shards(data: dict[str, list[dict]], out_dir: Path) -> tuple[dict, int]:
+    # 回傳 (manifest, 實際寫了幾個檔)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    previous = _manifest_files(out_dir / "manifest.json")
+    written = 0
+    stores = {}
+    for store, videos in data.items():
+        body = render_shard(store, videos)
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        name = f"{store_slug(store)}.{digest}.json"
+        written += _write_if_changed(out_dir / name, body)
+        stores[store] = {"file": name, "hash": digest, "count": len(videos)}
+
+    manifest = {"version": SHARD_FORMAT_VERSION, "stores": stores}
+    manifest_body = (json.dumps(manifest, ensure_ascii=False, indent=2) + "\n").encode("utf-8")
+    if not _write_if_changed(out_dir / "manifest.json", manifest_body):
+        return manifest, written
+    written += 1
+
+    keep = {entry["file"] for entry in stores.values()} | previous | {"manifest.json"}
+    for path in out_dir.glob("*.json"):
+        if path.name not in keep:
+            path.unlink()
+            written += 1
+    return manifest, written
+
+
+def main():
+    root = Path(__file__).resolve().parent.parent
+    ap = argparse.ArgumentParser(description="把 data/youtube.json 拆成前端用的每家超商分片")
+    ap.add_argument("--data", default=str(root / "data" / "youtube.json"))
+    ap.add_argument("--out-dir", default=str(root / "data" / "youtube"))
+    args = ap.parse_args()
+
+    data = json.loads(Path(args.data).read_text(encoding="utf-8-sig"))
+    manifest, written = build_shards(data, Path(args.out_dir))
+    summary = ", ".join(f"{store}={entry['count']}" for store, entry in manifest["stores"].items())
+    print(f"OK: {args.out_dir} ({summary}; {written} files changed)")
+
+
+if __name__ == "__main__":
+    main()
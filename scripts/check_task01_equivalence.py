@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import generate_task01 as g  # noqa: E402
+
+
+# -----------------------
+# 快速版 vs 參考版的等價檢查
+# - extract_terms        ↔ extract_terms_from_text（整段 join 起來再抽）
+# - classify_paragraphs  ↔ looks_like_code（逐段）
+# - extract_internal_notes_incremental ↔ extract_internal_notes（同一本書連續改幾版、沿用上一版的 state）
+# - validate_story_fast  ↔ validate_story（通過與否 + 錯誤訊息）
+# - 隨機輸入刻意塞滿邊界字元（符號、「：」「、」「。」、換行、TitleCase / 縮寫 / 含 . - _ 的詞）
+# - 同樣的 --seed 一定產生同一組案例；有任何不一致就印出來並以 exit code 1 結束
+# -----------------------
+_WORDS = [
+    "LangGraph", "NotebookLM", "GitHub", "RAG", "LLM", "API", "Python-3.11", "node.js", "Next.js",
+    "snake_case", "CI/CD", "JSON", "Json", "json", "the", "and", "App", "app", "OK", "a", "I",
+    "const", "let", "return", "def", "print", "import", "from", "await", "None", "True", "data",
+    "Title", "x", "Ab", "AB", "A.", "a-b", "A_b", "v2", "X-", "_x", "Ünïcode", "ΑΒΓ",
+]
+_CHUNKS = [
+    "今天我們來看看", "這一步的重點是", "最後記得檢查輸出", "：", "、", "，", ",", "。", " ", " ", "  ",
+    "{", "}", "(", ")", "[", "]", ";", "=", "<", ">", "/", "*", "\\", "|", "`", "```", "~", "$", "#", "@",
+    ".", "-", "_", "\t", "0", "42",
+]
+
+
+def random_paragraph(rng: random.Random, max_parts: int = 24) -> str:
+    parts = []
+    for _ in range(rng.randint(0, max_parts)):
+        r = rng.random()
+        if r < 0.45:
+            parts.append(rng.choice(_WORDS))
+        elif r < 0.9:
+            parts.append(rng.choice(_CHUNKS))
+        else:
+            parts.append("".join(rng.choice(_CHUNKS + _WORDS) for _ in range(rng.randint(1, 4))))
+    text = "".join(parts)
+    if rng.random() < 0.1:  # 規則 4：{ ... }
+        text = "{" + text + "}"
+    if rng.random() < 0.1:  # strip 前後的空白
+        text = rng.choice([" ", "\t", "  "]) + text + rng.choice(["", " ", "\n"])
+    return text
+
+
+def random_line(rng: random.Random) -> str:
+    # keyword dump 專用：只用會影響判定的字元，案例才夠密
+    alphabet = "：、,。\nab中"
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 80)))
+
+
+# -----------------------
+# 各項比較；回傳不一致的描述（一致就回傳 None）
+# -----------------------
+def check_extract_terms(rng: random.Random, workers: int) -> str | None:
+    paragraphs = [random_paragraph(rng) for _ in range(rng.randint(0, 30))]
+    top_k = rng.choice([1, 3, 12, 50])
+    fast = g.extract_terms(paragraphs, top_k=top_k, workers=workers)
+    ref = g.extract_terms_from_text("\n".join(paragraphs), top_k=top_k)
+    if fast != ref:
+        return f"extract_terms top_k={top_k}: {fast!r} != {ref!r}\n  paragraphs={paragraphs!r}"
+    return None
+
+
+def check_classify(rng: random.Random) -> str | None:
+    paragraphs = [random_paragraph(rng) for _ in range(rng.randint(1, 20))]
+    fast = g.classify_paragraphs(paragraphs)
+    ref = [g.looks_like_code(p) for p in paragraphs]
+    for p, a, b in zip(paragraphs, fast, ref):
+        if a != b:
+            return f"classify_paragraphs: {a} != looks_like_code {b} for {p!r}"
+    return None
+
+
+def random_revision(rng: random.Random, paragraphs: list[str]) -> list[str]:
+    # 模擬改稿：插入、刪除、改寫、複製（同一段出現多次）、搬動
+    paragraphs = list(paragraphs)
+    for _ in range(rng.randint(0, 6)):
+        op = rng.random()
+        i = rng.randrange(len(paragraphs) + 1)
+        if op < 0.25 or not paragraphs:
+            paragraphs.insert(i, random_paragraph(rng))
+        elif op < 0.45:
+            del paragraphs[min(i, len(paragraphs) - 1)]
+        elif op < 0.65:
+            paragraphs[min(i, len(paragraphs) - 1)] = random_paragraph(rng)
+        elif op < 0.85:
+            paragraphs.insert(i, rng.choice(paragraphs))
+        else:
+            paragraphs.insert(i, paragraphs.pop(rng.randrange(len(paragraphs))))
+    return paragraphs
+
+
+def check_incremental(rng: random.Random) -> str | None:
+    paragraphs = [random_paragraph(rng) for _ in range(rng.randint(0, 20))]
+    state = None
+    for rev in range(rng.randint(2, 6)):
+        fast, state = g.extract_internal_notes_incremental(paragraphs, state)
+        ref = g.extract_internal_notes(paragraphs)
+        if fast != ref:
+            diff = {k: (fast.get(k), ref.get(k)) for k in fast.keys() | ref.keys() if fast.get(k) != ref.get(k)}
+            return f"extract_internal_notes_incremental rev {rev}: {diff!r}\n  paragraphs={paragraphs!r}"
+        state = json.loads(json.dumps(state))  # 跟 notes 快取一樣存成 JSON 再讀回來
+        paragraphs = random_revision(rng, paragraphs)
+    return None
+
+
+def _validation_error(fn, template, notes: dict, story: list[str]) -> str | None:
+    try:
+        fn(template, notes, story)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def random_story(rng: random.Random, template: g.CompiledTemplate) -> tuple[dict, list[str]]:
+    pool = rng.sample(_WORDS, rng.randint(0, 15))
+    observed = pool + rng.sample(pool, min(len(pool), rng.randint(0, 2)))  # 偶爾有重複的詞
+    notes = {"observed_terms": observed}
+    story = g.generate_task01_story(template, {"observed_terms": rng.sample(_WORDS, rng.randint(0, 6))})
+
+    # 隨機破壞：段落數、快照句、keyword dump、名詞命中
+    r = rng.random()
+    if r < 0.1:
+        story = story[:-1]
+    elif r < 0.2:
+        story = story + [random_paragraph(rng)]
+    elif r < 0.3:
+        story = [p.replace(template.snapshot, "") for p in story]
+    if rng.random() < 0.3 and story:  # 段落數不變，才會走到 keyword dump 判定
+        i = rng.randrange(len(story))
+        story[i] = random_line(rng).replace("\n", "") + random_paragraph(rng, 6) + story[i]
+    if rng.random() < 0.5 and story:
+        i = rng.randrange(len(story))
+        story[i] += "".join(rng.sample(observed, min(len(observed), rng.randint(0, 5))))
+    return notes, story
+
+
+def check_validate(rng: random.Random, templates: list[g.CompiledTemplate]) -> str | None:
+    template = rng.choice(templates)
+    notes, story = random_story(rng, template)
+    fast = _validation_error(g.validate_story_fast, template, notes, story)
+    ref = _validation_error(g.validate_story, template, notes, story)
+    if fast != ref:
+        return f"validate_story_fast: {fast!r} != {ref!r}\n  notes={notes!r}\n  story={story!r}"
+    return None
+
+
+# -----------------------
+# 主程式
+# -----------------------
+def main():
+    root = Path(__file__).resolve().parent.parent
+    ap = argparse.ArgumentParser(description="比對 Task01 快速版函式與參考實作的輸出是否一致")
+    ap.add_argument("--cases", type=int, default=2000, help="每一項檢查跑幾個隨機案例")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--templates-dir", default=str(root / "templates"))
+    ap.add_argument("--workers", type=int, default=1, help="extract_terms 的 workers（>1 一併檢查平行計數）")
+    ap.add_argument("--max-report", type=int, default=5, help="每一項最多印幾個不一致的案例")
+    args = ap.parse_args()
+
+    templates = [g.load_template(p) for p in sorted(Path(args.templates_dir).glob("*.yml"))]
+    if not templates:
+        print(f"沒有找到模板：{args.templates_dir}", file=sys.stderr)
+        sys.exit(1)
+
+    checks = {
+        "extract_terms": lambda rng: check_extract_terms(rng, args.workers),
+        "classify_paragraphs": check_classify,
+        "extract_internal_notes_incremental": check_incremental,
+        "validate_story_fast": lambda rng: check_validate(rng, templates),
+    }
+    failed = 0
+    for name, check in checks.items():
+        rng = random.Random(f"{args.seed}:{name}")  # 每項各自的亂數流，單獨加減一項不影響其他項
+        mismatches = 0
+        for _ in range(args.cases):
+            problem = check(rng)
+            if problem is None:
+                continue
+            mismatches += 1
+            if mismatches <= args.max_report:
+                print(f"MISMATCH: {problem}", file=sys.stderr)
+        print(f"{'OK' if not mismatches else 'FAIL'}: {name} ({args.cases} cases, {mismatches} mismatches)")
+        failed += bool(mismatches)
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,512 +1,539 @@
-<!doctype html>
-<html lang="zh-Hant">
-<head>
-  <meta charset="UTF-8">
-  <meta name="viewport" content="width=device-width, initial-scale=1.0">
-  <title>Abby 的粉紅生活日常</title>
-  <style>
-    :root {
-      --pink: #f8d7e3;
-      --cream: #fdf1f6;
-      --rose: #f4bcd4;
-      --white: #ffffff;
-      --brown: #6b4b3c;
-      --shadow: 0 18px 40px rgba(244, 188, 212, 0.45);
-      --text: #57413a;
-      --muted: #8c6f64;
-      --transition: 180ms ease;
-    }
-
-    * { box-sizing: border-box; }
-
-    body {
-      margin: 0;
-      font-family: "Noto Sans TC", "PingFang TC", "Microsoft JhengHei", sans-serif;
-      color: var(--text);
-      background: linear-gradient(180deg, var(--cream), var(--pink));
-      scroll-behavior: smooth;
-    }
-
-    a { color: inherit; text-decoration: none; }
-
-    header {
-      position: fixed;
-      top: 0;
-      left: 0;
-      right: 0;
-      z-index: 10;
-      backdrop-filter: blur(10px);
-      background: rgba(255, 255, 255, 0.8);
-      border-bottom: 1px solid rgba(244, 188, 212, 0.6);
-    }
-
-    .nav {
-      max-width: 1080px;
-      margin: 0 auto;
-      padding: 14px 18px;
-      display: flex;
-      align-items: center;
-      justify-content: space-between;
-      gap: 16px;
-    }
-
-    .logo {
-      font-weight: 800;
-      letter-spacing: 1px;
-      font-size: 18px;
-      color: var(--brown);
-      display: flex;
-      align-items: center;
-      gap: 8px;
-    }
-
-    .logo .dot {
-      width: 12px;
-      height: 12px;
-      border-radius: 50%;
-      background: var(--rose);
-      display: inline-block;
-      box-shadow: 0 0 0 6px rgba(244, 188, 212, 0.25);
-    }
-
-    .nav-links { display: flex; gap: 12px; }
-
-    .nav-links a {
-      padding: 8px 14px;
-      border-radius: 999px;
-      background: var(--white);
-      border: 1px solid rgba(244, 188, 212, 0.7);
-      box-shadow: var(--shadow);
-      font-weight: 600;
-      font-size: 14px;
-      transition: transform var(--transition), box-shadow var(--transition);
-    }
-
-    .nav-links a:hover {
-      transform: translateY(-2px);
-      box-shadow: 0 12px 24px rgba(244, 188, 212, 0.6);
-    }
-
-    main {
-      max-width: 1080px;
-      margin: 0 auto;
-      padding: 110px 18px 64px;
-      display: flex;
-      flex-direction: column;
-      gap: 72px;
-    }
-
-    section {
-      background: var(--white);
-      border-radius: 28px;
-      padding: 36px 28px;
-      box-shadow: var(--shadow);
-      border: 1px solid rgba(244, 188, 212, 0.4);
-      position: relative;
-      overflow: hidden;
-    }
-
-    .hero {
-      display: grid;
-      grid-template-columns: repeat(auto-fit, minmax(280px, 1fr));
-      align-items: center;
-      gap: 32px;
-      background: linear-gradient(145deg, var(--cream), var(--pink));
-    }
-
-    h1 {
-      margin: 0 0 12px;
-      font-size: clamp(28px, 5vw, 42px);
-      color: var(--brown);
-      letter-spacing: 1px;
-    }
-
-    p.lead {
-      margin: 0 0 20px;
-      color: var(--muted);
-      line-height: 1.6;
-      font-size: 16px;
-    }
-
-    .hero-cta {
-      display: flex;
-      flex-wrap: wrap;
-      gap: 12px;
-    }
-
-    .dog-btn {
-      position: relative;
-      padding: 14px 18px 14px 44px;
-      border: none;
-      background: var(--white);
-      border-radius: 18px;
-      cursor: pointer;
-      font-weight: 700;
-      color: var(--brown);
-      box-shadow: var(--shadow);
-      transition: transform var(--transition), box-shadow var(--transition), background var(--transition);
-      outline: none;
-    }
-
-    .dog-btn::before,
-    .dog-btn::after {
-      content: "";
-      position: absolute;
-      width: 16px;
-      height: 18px;
-      background: var(--rose);
-      border-radius: 12px 12px 4px 4px;
-      top: 6px;
-      box-shadow: 0 4px 0 rgba(0, 0, 0, 0.05) inset;
-    }
-
-    .dog-btn::before { left: 10px; transform: rotate(-6deg); }
-    .dog-btn::after  { left: 26px; transform: rotate( 6deg); }
-
-    .dog-btn span { position: relative; z-index: 1; }
-
-    .dog-btn:hover {
-      transform: translateY(-3px);
-      box-shadow: 0 16px 30px rgba(244, 188, 212, 0.6);
-    }
-
-    .dog-btn.active { background: var(--rose); color: var(--white); }
-
-    .dog-icon-btn {
-      display: inline-flex;
-      flex-direction: column;
-      align-items: center;
-      gap: 8px;
-      padding: 16px 16px 14px;
-      min-width: 132px;
-      background: var(--white);
-      border: 1px solid rgba(244, 188, 212, 0.7);
-      box-shadow: var(--shadow);
-      transition: transform 140ms ease, box-shadow var(--transition), background var(--transition), border-color var(--transition);
-    }
-
-    .dog-icon-btn svg { width: 74px; height: 74px; }
-    .dog-icon-btn::before, .dog-icon-btn::after { display: none; }
-
-    .dog-icon-btn .label {
-      font-weight: 700;
-      color: var(--brown);
-      letter-spacing: 0.3px;
-    }
-
-    .dog-icon-btn:hover {
-      transform: translateY(-2px) scale(1.02);
-      box-shadow: 0 16px 30px rgba(244, 188, 212, 0.6);
-    }
-
-    .dog-icon-btn.active {
-      background: var(--rose);
-      color: var(--white);
-      border-color: #e19cbb;
-      box-shadow: 0 18px 32px rgba(244, 188, 212, 0.65);
-    }
-
-    .dog-icon-btn.active .label { color: var(--white); }
-
-    .dog-icon-btn.active svg path,
-    .dog-icon-btn.active svg circle,
-    .dog-icon-btn.active svg ellipse {
-      stroke: #fef6f9;
-      fill: #fce8f0;
-    }
-
-    .hero-illustration {
-      position: relative;
-      width: 100%;
-      max-width: 420px;
-      margin: 0 auto;
-      aspect-ratio: 1 / 1;
-    }
-
-    .hero svg { width: 100%; height: 100%; display: block; }
-
-    .tag {
-      display: inline-flex;
-      align-items: center;
-      gap: 6px;
-      padding: 8px 12px;
-      background: var(--white);
-      border-radius: 999px;
-      font-weight: 600;
-      color: var(--muted);
-      border: 1px dashed rgba(244, 188, 212, 0.7);
-      margin-bottom: 12px;
-    }
-
-    .section-title {
-      margin: 0 0 10px;
-      font-size: 26px;
-      color: var(--brown);
-      letter-spacing: 0.5px;
-    }
-
-    .placeholder {
-      margin: 0;
-      color: var(--muted);
-      line-height: 1.7;
-    }
-
-    .work   { background: linear-gradient(160deg, var(--pink), var(--cream)); }
-    .family { background: linear-gradient(200deg, var(--cream), var(--white)); }
-    .personal{ background: linear-gradient(140deg, var(--white), var(--cream)); }
-
-    .floating-dog {
-      position: absolute;
-      right: 14px;
-      bottom: -12px;
-      width: 180px;
-      opacity: 0.16;
-      pointer-events: none;
-    }
-
-    .paw {
-      position: absolute;
-      width: 48px;
-      height: 48px;
-      border-radius: 50%;
-      background: rgba(244, 188, 212, 0.35);
-      filter: blur(2px);
-      opacity: 0.6;
-    }
-
-    .paw::after,
-    .paw::before {
-      content: "";
-      position: absolute;
-      width: 16px;
-      height: 16px;
-      border-radius: 50%;
-      background: rgba(244, 188, 212, 0.35);
-    }
-
-    .paw::before { top: -6px; left: 8px; }
-    .paw::after  { top:  8px; left: -6px; }
-
-    .toggle-row {
-      display: flex;
-      gap: 10px;
-      flex-wrap: wrap;
-      margin: 12px 0 18px;
-    }
-
-    .card {
-      background: var(--white);
-      border-radius: 16px;
-      padding: 16px;
-      border: 1px solid rgba(244, 188, 212, 0.5);
-      box-shadow: var(--shadow);
-      margin-top: 6px;
-    }
-
-    .card h4 { margin: 0 0 6px; color: var(--brown); }
-    .card p  { margin: 0; color: var(--muted); line-height: 1.6; }
-
-    /* === MVP 區塊樣式（新增）=== */
-    .mvp-box{
-      margin-top: 14px;
-      padding: 14px;
-      border-radius: 16px;
-      border: 2px dashed rgba(244, 188, 212, 0.9);
-      background: linear-gradient(180deg, rgba(253, 241, 246, 0.75), rgba(255,255,255,0.9));
-    }
-    .mvp-title{
-      margin: 0 0 10px;
-      font-size: 14px;
-      font-weight: 800;
-      color: var(--brown);
-      letter-spacing: 0.2px;
-    }
-    #store-buttons .dog-btn{
-      padding-left: 44px;
-    }
-    #video-list{
-      margin: 0;
-      padding-left: 22px;
-      color: var(--muted);
-      line-height: 1.7;
-    }
-
-    @media (max-width: 720px) {
-      header { position: sticky; }
-      .nav { flex-direction: column; align-items: flex-start; }
-      main { padding-top: 96px; gap: 56px; }
-      section { padding: 28px 22px; }
-      .floating-dog { width: 130px; opacity: 0.22; }
-    }
-  </style>
-</head>
-<body>
-  <header>
-    <div class="nav">
-      <div class="logo">
-        <span class="dot"></span>
-        <span>Abby 的粉紅生活日常</span>
-      </div>
-      <nav class="nav-links">
-        <a href="#work">工作</a>
-        <a href="#family">家庭</a>
-        <a href="#personal">個人</a>
-      </nav>
-    </div>
-  </header>
-
-  <main>
-    <section class="hero" id="hero">
-      <div>
-        <div class="tag">Pink Chihuahua Mood</div>
-        <h1>粉色系 × 插畫風吉娃娃的日常陪伴</h1>
-        <p class="lead">柔和的淺粉與奶油色，輕盈的留白，加上一隻愛撒嬌的吉娃娃插畫，陪你從工作到家庭，再到個人生活的小確幸。</p>
-        <div class="hero-cta">
-          <button class="dog-btn" data-target="#work"><span>工作</span></button>
-          <button class="dog-btn" data-target="#family"><span>家庭</span></button>
-          <button class="dog-btn" data-target="#personal"><span>個人生活</span></button>
-        </div>
-      </div>
-      <div class="hero-illustration">
-        <svg viewBox="0 0 320 320" xmlns="http://www.w3.org/2000/svg" aria-hidden="true">
-          <defs>
-            <linearGradient id="fur" x1="0%" y1="0%" x2="100%" y2="100%">
-              <stop offset="0%" stop-color="#fbe3ea"/>
-              <stop offset="100%" stop-color="#f7c9d9"/>
-            </linearGradient>
-          </defs>
-          <circle cx="160" cy="160" r="150" fill="#fce8f0"/>
-          <g>
-            <path d="M70 110 C72 60 120 62 142 96 L126 132 Z" fill="url(#fur)" stroke="#e1a7bc" stroke-width="3" stroke-linejoin="round"/>
-            <path d="M250 110 C248 60 200 62 178 96 L194 132 Z" fill="url(#fur)" stroke="#e1a7bc" stroke-width="3" stroke-linejoin="round"/>
-            <path d="M110 250 C110 210 110 180 160 180 C210 180 210 210 210 250" fill="#fef6f9" stroke="#e1a7bc" stroke-width="3"/>
-            <path d="M110 140 Q160 120 210 140 Q222 190 210 240 Q160 260 110 240 Q98 190 110 140 Z" fill="url(#fur)" stroke="#e1a7bc" stroke-width="3" />
-            <ellipse cx="140" cy="168" rx="10" ry="14" fill="#3b2b25"/>
-            <ellipse cx="180" cy="168" rx="10" ry="14" fill="#3b2b25"/>
-            <circle cx="141" cy="164" r="3" fill="#fff"/>
-            <circle cx="181" cy="164" r="3" fill="#fff"/>
-            <path d="M158 184 Q160 188 162 184" stroke="#3b2b25" stroke-width="3" stroke-linecap="round"/>
-            <path d="M150 196 Q160 206 170 196" fill="none" stroke="#d18c9f" stroke-width="4" stroke-linecap="round"/>
-            <path d="M152 206 Q160 214 168 206" fill="#f2b8c7" stroke="#d18c9f" stroke-width="2" stroke-linecap="round"/>
-            <circle cx="136" cy="188" r="6" fill="#f4c1d3" opacity="0.9"/>
-            <circle cx="184" cy="188" r="6" fill="#f4c1d3" opacity="0.9"/>
-            <path d="M130 226 Q160 238 190 226" fill="none" stroke="#e1a7bc" stroke-width="3" stroke-linecap="round"/>
-            <path d="M108 118 Q132 108 142 132" fill="#fcecf2" stroke="#e1a7bc" stroke-width="3" stroke-linecap="round"/>
-            <path d="M212 118 Q188 108 178 132" fill="#fcecf2" stroke="#e1a7bc" stroke-width="3" stroke-linecap="round"/>
-          </g>
-        </svg>
-      </div>
-    </section>
-
-    <section id="work" class="work">
-      <div class="paw" style="top:18px; left:18px;"></div>
-      <div class="paw" style="bottom:24px; right:32px;"></div>
-      <img src="data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 160 120'%3E%3Cpath d='M24 50 Q40 10 70 26 Q96 10 116 44 L124 80 Q120 104 90 104 L44 96 Q18 84 24 50Z' fill='%23fce8f0' stroke='%23e1a7bc' stroke-width='4' stroke-linejoin='round'/%3E%3Cpath d='M62 64 Q74 70 86 64' stroke='%236b4b3c' stroke-width='5' fill='none' stroke-linecap='round'/%3E%3Cellipse cx='60' cy='56' rx='6' ry='9' fill='%236b4b3c'/%3E%3Cellipse cx='94' cy='56' rx='6' ry='9' fill='%236b4b3c'/%3E%3Ccircle cx='60' cy='52' r='2' fill='%23fff'/%3E%3Ccircle cx='94' cy='52' r='2' fill='%23fff'/%3E%3C/svg%3E" alt="" class="floating-dog">
-      <div class="tag">Work Mode</div>
-      <h2 class="section-title">工作區</h2>
-      <p class="placeholder">預留出版與工作內容，吉娃娃在旁溫柔守護，讓粉色系的靈感陪你完成每個案子。</p>
-    </section>
-
-    <section id="family" class="family">
-      <div class="paw" style="top:14px; right:18px;"></div>
-      <div class="paw" style="bottom:18px; left:32px;"></div>
-      <div class="tag">Home Sweet Pink</div>
-      <h2 class="section-title">家庭區</h2>
-      <p class="placeholder">預留家庭記事與粉粉日常，吉娃娃腳印點綴，輕盈留白讓每段故事都有呼吸感。</p>
-    </section>
-
-    <section id="personal" class="personal">
-      <div class="tag">Personal Picks</div>
-      <h2 class="section-title">個人生活：新品開箱 × 超商必買</h2>
-
-      <div class="toggle-row">
-        <button class="dog-btn dog-icon-btn active" data-panel="unbox">
-          <svg viewBox="0 0 120 120" xmlns="http://www.w3.org/2000/svg" aria-hidden="true">
-            <path d="M26 42 Q30 14 52 22 Q70 14 86 34 L92 62 Q90 84 70 90 L48 88 Q28 84 26 64 Z" fill="#fce8f0" stroke="#e1a7bc" stroke-width="4" stroke-linejoin="round"/>
-            <ellipse cx="48" cy="58" rx="7" ry="10" fill="#6b4b3c"/>
-            <ellipse cx="72" cy="58" rx="7" ry="10" fill="#6b4b3c"/>
-            <circle cx="48" cy="54" r="2.5" fill="#fff"/>
-            <circle cx="72" cy="54" r="2.5" fill="#fff"/>
-            <path d="M54 68 Q60 74 66 68" stroke="#d18c9f" stroke-width="4" fill="none" stroke-linecap="round"/>
-            <path d="M52 74 Q60 80 68 74" fill="#f2b8c7" stroke="#d18c9f" stroke-width="2" stroke-linecap="round"/>
-            <circle cx="44" cy="70" r="5" fill="#f4c1d3" opacity="0.9"/>
-            <circle cx="76" cy="70" r="5" fill="#f4c1d3" opacity="0.9"/>
-          </svg>
-          <span class="label">新品開箱</span>
-        </button>
-
-        <button class="dog-btn dog-icon-btn" data-panel="conbini">
-          <svg viewBox="0 0 120 120" xmlns="http://www.w3.org/2000/svg" aria-hidden="true">
-            <path d="M28 44 Q32 18 56 24 Q74 16 90 38 L94 62 Q92 86 70 92 L46 90 Q24 86 28 64 Z" fill="#fce8f0" stroke="#e1a7bc" stroke-width="4" stroke-linejoin="round"/>
-            <ellipse cx="52" cy="60" rx="6.5" ry="9" fill="#6b4b3c"/>
-            <ellipse cx="76" cy="60" rx="6.5" ry="9" fill="#6b4b3c"/>
-            <circle cx="52" cy="56" r="2.4" fill="#fff"/>
-            <circle cx="76" cy="56" r="2.4" fill="#fff"/>
-            <path d="M56 68 Q64 74 72 68" stroke="#d18c9f" stroke-width="4" fill="none" stroke-linecap="round"/>
-            <path d="M54 74 Q64 80 74 74" fill="#f2b8c7" stroke="#d18c9f" stroke-width="2" stroke-linecap="round"/>
-            <path d="M40 46 Q46 40 54 48" fill="#fcecf2" stroke="#e1a7bc" stroke-width="3" stroke-linecap="round"/>
-            <path d="M84 46 Q78 40 70 48" fill="#fcecf2" stroke="#e1a7bc" stroke-width="3" stroke-linecap="round"/>
-            <circle cx="44" cy="70" r="5" fill="#f4c1d3" opacity="0.9"/>
-            <circle cx="84" cy="70" r="5" fill="#f4c1d3" opacity="0.9"/>
-          </svg>
-          <span class="label">超商必買</span>
-        </button>
-      </div>
-
-      <div class="card" data-panel-content="unbox">
-        <h4>新品開箱</h4>
-        <p>預設顯示新品開箱心得，粉嫩色調搭配吉娃娃插畫，分享每件療癒小物的第一印象與使用感。</p>
-      </div>
-
-      <div class="card" data-panel-content="conbini" style="display: none;">
-        <h4>超商必買</h4>
-        <p>切換後可看到超商必買清單：粉系甜點、暖心飲品、療癒文具，與吉娃娃一起尋找小確幸。</p>
-
-        <!-- ✅ MVP 區塊（新增） -->
-        <div class="mvp-box">
-          <div class="mvp-title">YouTube 本月熱門影片（MVP）</div>
-
-          <!-- ✅ 超商按鈕（新增，下一步接 JS） -->
-          <div class="toggle-row" id="store-buttons">
-            <button class="dog-btn" data-store="7-11"><span>7-11</span></button>
-            <button class="dog-btn" data-store="全家"><span>全家</span></button>
-            <button class="dog-btn" data-store="萊爾富"><span>萊爾富</span></button>
-          </div>
-
-          <!-- ✅ 影片清單容器（新增） -->
-          <ol id="video-list">
-            <li>（這裡會顯示影片清單）</li>
-          </ol>
-        </div>
-      </div>
-    </section>
-  </main>
-
-  <script>
-    const heroButtons = document.querySelectorAll('.hero-cta .dog-btn');
-    heroButtons.forEach(btn => {
-      btn.addEventListener('click', () => {
-        const target = document.querySelector(btn.dataset.target);
-        if (target) {
-          heroButtons.forEach(b => b.classList.remove('active'));
-          btn.classList.add('active');
-          target.scrollIntoView({ behavior: 'smooth', block: 'start' });
-        }
-      });
-    });
-
-    const toggleButtons = document.querySelectorAll('[data-panel]');
-    const toggleCards = document.querySelectorAll('[data-panel-content]');
-
-    toggleButtons.forEach(btn => {
-      btn.addEventListener('click', () => {
-        const panel = btn.dataset.panel;
-        toggleButtons.forEach(b => b.classList.toggle('active', b === btn));
-        toggleCards.forEach(card => {
-          card.style.display = card.dataset.panelContent === panel ? 'block' : 'none';
-        });
-      });
-    });
-  </script>
-</body>
-</html>
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import gzip
+import hashlib
+import http.client
+import json
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+
+# -----------------------
+# 設定
+# - data/youtube.json：{"7-11": [...], "全家": [...], "萊爾富": [...]}
+# - 每筆影片：title / channel / publishedAt / url / duration（"16:24"、"1:02:03"）
+# -----------------------
+API_BASE = "https://www.googleapis.com/youtube/v3"
+STORE_QUERIES = {
+    "7-11": "7-11 新品",
+    "全家": "全家 新品",
+    "萊爾富": "萊爾富 新品",
+}
+DEFAULT_MAX_RESULTS = 10
+DEFAULT_WINDOW_DAYS = 31
+VIDEOS_BATCH = 50  # videos.list 一次最多 50 個 id
+
+
+class YouTubeAPIError(RuntimeError):
+    pass
+
+
+# -----------------------
+# 連線池（keep-alive）
+# - 同一個 host 的連線用完放回池子，下一個請求直接沿用，不重新 TCP/TLS 握手
+# - 池子大小 = 同時在飛的請求數；閒置太久被伺服器關掉的連線，失敗時換新連線重送一次
+# -----------------------
+# 快取 / 重播用的請求識別不含 API key，也不含每天都會往後移的 publishedAfter：
+# 今天的搜尋照樣帶新的 publishedAfter 送出，只是附上昨天那份的 ETag，結果沒變就回 304
+_KEY_IGNORED_PARAMS = {"key", "publishedAfter"}
+
+
+def request_key(endpoint: str, params: dict) -> str:
+    return endpoint + "?" + urlencode(sorted(
+        (k, str(v)) for k, v in params.items() if k not in _KEY_IGNORED_PARAMS
+    ))
+
+
+class HTTPPool:
+    def __init__(self, base_url: str, size: int = 4, timeout: float = 20.0):
+        url = urlsplit(base_url)
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.prefix = url.path.rstrip("/")
+        self.timeout = timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.requests = 0
+        self.connections = 0
+        self._stats_lock = threading.Lock()
+
+    def _connect(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        with self._stats_lock:
+            self.connections += 1
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _send(self, conn: http.client.HTTPConnection, path: str, headers: dict) -> tuple[int, dict, bytes, bool]:
+        conn.request("GET", path, headers={"Accept-Encoding": "gzip", **headers})
+        resp = conn.getresponse()
+        body = resp.read()
+        if resp.getheader("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        return resp.status, {k.lower(): v for k, v in resp.getheaders()}, body, resp.will_close
+
+    def get(self, endpoint: str, params: dict, headers: dict | None = None) -> tuple[int, dict, bytes]:
+        path = f"{self.prefix}/{endpoint}?{urlencode(params)}"
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+                reused = True
+            except queue.Empty:
+                conn, reused = self._connect(), False
+            try:
+                status, resp_headers, body, will_close = self._send(conn, path, headers or {})
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if not reused:
+                    raise
+                conn = self._connect()  # 池裡的連線已被對方關掉：換新的重送一次
+                status, resp_headers, body, will_close = self._send(conn, path, headers or {})
+            if will_close:
+                conn.close()
+            else:
+                self._idle.put(conn)
+        with self._stats_lock:
+            self.requests += 1
+        return status, resp_headers, body
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def _error_message(body: bytes) -> str:
+    try:
+        return json.loads(body)["error"]["message"]
+    except (ValueError, KeyError, TypeError):
+        return body[:200].decode("utf-8", "replace")
+
+
+# -----------------------
+# 回應快取（--cache-dir）
+# - responses/<hash>.json：每個請求一份 {request, headers(etag / last-modified), fetched_at, body}
+#   格式與 youtube_stub.py --fixtures 相同，快取資料夾可以直接拿去重播
+# - 有快取時送條件式請求（If-None-Match / If-Modified-Since），304 直接用快取的 body
+# - videos.json：每支影片的 videos.list item；影片細節幾乎不變，只替「沒看過的 id」發請求
+#   videos.list 的回應本身不進 responses/：key 是整串 id，之後不會再用到，只會越積越多
+# - quota.jsonl：每次執行的請求數 / 配額一行，只留最近 QUOTA_LOG_MAX_RUNS 次
+# - --offline：完全不連網，只從快取回答（測試 / 壓測用），缺的請求直接報錯
+# - 配額：search.list 100 units、videos.list 1 unit；304 是否計費官方沒有保證，另外記一個上限值
+# -----------------------
+QUOTA_COST = {"search": 100, "videos": 1}
+QUOTA_LOG_MAX_RUNS = 366  # quota.jsonl 保留的執行次數（每晚一次 ≈ 一年）
+
+
+def fixture_name(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:24] + ".json"
+
+
+def write_json_atomic(path: Path, data) -> None:
+    # 暫存檔名帶 thread id：快取會從多個 thread 同時寫
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class ResponseCache:
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.responses_dir = self.cache_dir / "responses"
+        self._videos: dict[str, dict] | None = None
+        self._videos_dirty = False
+        self._lock = threading.Lock()
+
+    def load(self, key: str) -> dict | None:
+        try:
+            return json.loads((self.responses_dir / fixture_name(key)).read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def store(self, key: str, headers: dict, body: dict) -> None:
+        write_json_atomic(self.responses_dir / fixture_name(key), {
+            "request": key,
+            "headers": {k: headers[k] for k in ("etag", "last-modified") if k in headers},
+            "fetched_at": time.time(),
+            "body": body,
+        })
+
+    def _video_table(self) -> dict[str, dict]:
+        if self._videos is None:
+            try:
+                self._videos = json.loads((self.cache_dir / "videos.json").read_text(encoding="utf-8"))
+            except (FileNotFoundError, ValueError):
+                self._videos = {}
+        return self._videos
+
+    def cached_videos(self, ids: list[str]) -> dict[str, dict]:
+        with self._lock:
+            table = self._video_table()
+            return {vid: table[vid] for vid in ids if vid in table}
+
+    def store_videos(self, items: list[dict]) -> None:
+        with self._lock:
+            table = self._video_table()
+            for item in items:
+                if table.get(item["id"]) != item:
+                    table[item["id"]] = item
+                    self._videos_dirty = True
+
+    def save_videos(self, published_after: str, keep: Iterable[str] = ()) -> None:
+        # 早於搜尋視窗的影片不會再被搜到，順便清掉；這次搜尋結果裡有的（keep）一律留著，
+        # 重播時 videos.list 只能從這裡回答
+        keep = set(keep)
+        with self._lock:
+            table = self._video_table()
+            stale = [vid for vid, item in table.items()
+                     if vid not in keep and item.get("snippet", {}).get("publishedAt", "") < published_after]
+            for vid in stale:
+                del table[vid]
+            if self._videos_dirty or stale:
+                write_json_atomic(self.cache_dir / "videos.json", table)
+                self._videos_dirty = False
+        self.prune_responses()
+
+    def prune_responses(self) -> None:
+        # 只有 search 的回應會再被讀到；舊版快取留下的 videos.list 回應清掉
+        for path in self.responses_dir.glob("*.json"):
+            try:
+                key = json.loads(path.read_text(encoding="utf-8")).get("request", "")
+            except (OSError, ValueError, AttributeError):
+                key = ""
+            if not key.startswith("search?"):
+                path.unlink(missing_ok=True)
+
+    def log_run(self, stats: dict) -> None:
+        # 只留最近 QUOTA_LOG_MAX_RUNS 次：快取資料夾每晚被 actions/cache 帶著走，不能一直長
+        path = self.cache_dir / "quota.jsonl"
+        try:
+            lines = path.read_text(encoding="utf-8").splitlines()
+        except FileNotFoundError:
+            lines = []
+        lines.append(json.dumps(stats, ensure_ascii=False))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text("\n".join(lines[-QUOTA_LOG_MAX_RUNS:]) + "\n", encoding="utf-8")
+        os.replace(tmp, path)
+
+
+class APIClient:
+    def __init__(self, pool: HTTPPool | None, cache: ResponseCache | None = None,
+                 offline: bool = False, max_age: float = 0):
+        if offline and cache is None:
+            raise ValueError("離線模式需要快取資料夾")
+        self.pool = pool
+        self.cache = cache
+        self.offline = offline
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "not_modified": 0, "cache_hits": 0, "videos_from_cache": 0,
+                      "quota_units": 0, "quota_units_max": 0}
+
+    def _count(self, **delta: int) -> None:
+        with self._lock:
+            for k, v in delta.items():
+                self.stats[k] += v
+
+    def get_json(self, endpoint: str, params: dict, cacheable: bool = True) -> dict:
+        # cacheable=False：不查也不存 responses/（videos.list 另外以 videos.json 逐支快取）
+        key = request_key(endpoint, params)
+        entry = self.cache.load(key) if self.cache and cacheable else None
+        if entry is not None and (self.offline or time.time() - entry.get("fetched_at", 0) < self.max_age):
+            self._count(cache_hits=1)
+            return entry["body"]
+        if self.offline:
+            raise YouTubeAPIError(f"離線模式：快取裡沒有 {key}")
+
+        headers = {}
+        if entry is not None:
+            if "etag" in entry["headers"]:
+                headers["If-None-Match"] = entry["headers"]["etag"]
+            if "last-modified" in entry["headers"]:
+                headers["If-Modified-Since"] = entry["headers"]["last-modified"]
+        status, resp_headers, body = self.pool.get(endpoint, params, headers)
+        cost = QUOTA_COST.get(endpoint, 1)
+        if status == 304 and entry is not None:
+            self._count(requests=1, not_modified=1, quota_units_max=cost)
+            return entry["body"]
+        self._count(requests=1, quota_units=cost, quota_units_max=cost)
+        if status != 200:
+            raise YouTubeAPIError(f"{endpoint} 回傳 {status}：{_error_message(body)}")
+        data = json.loads(body)
+        if self.cache is not None and cacheable:
+            self.cache.store(key, resp_headers, data)
+        return data
+
+    def cached_videos(self, ids: list[str]) -> dict[str, dict]:
+        if self.cache is None:
+            return {}
+        found = self.cache.cached_videos(ids)
+        self._count(videos_from_cache=len(found))
+        return found
+
+    def store_videos(self, items: list[dict]) -> None:
+        if self.cache is not None:
+            self.cache.store_videos(items)
+
+
+# -----------------------
+# 欄位轉換
+# -----------------------
+_DURATION_RE = re.compile(r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+_VIDEO_ID_RE = re.compile(r"(?:[?&]v=|youtu\.be/|/shorts/)([A-Za-z0-9_-]{11})")
+
+
+def parse_iso_duration(text: str) -> int:
+    # "PT16M24S" → 984；直播中 / 格式不符回 0
+    m = _DURATION_RE.match(text or "")
+    if not m:
+        return 0
+    d, h, mi, s = (int(x or 0) for x in m.groups())
+    return ((d * 24 + h) * 60 + mi) * 60 + s
+
+
+def format_duration(seconds: int) -> str:
+    h, rest = divmod(seconds, 3600)
+    m, s = divmod(rest, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+
+def video_url(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+def video_id_from_url(url: str) -> str | None:
+    m = _VIDEO_ID_RE.search(url or "")
+    return m.group(1) if m else None
+
+
+def video_record(item: dict) -> dict:
+    snippet = item.get("snippet", {})
+    return {
+        "title": snippet.get("title", ""),
+        "channel": snippet.get("channelTitle", ""),
+        "publishedAt": snippet.get("publishedAt", ""),
+        "url": video_url(item["id"]),
+        "duration": format_duration(parse_iso_duration(item.get("contentDetails", {}).get("duration", ""))),
+    }
+
+
+def rfc3339(ts: dt.datetime) -> str:
+    return ts.astimezone(dt.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def window_start(now: dt.datetime, window_days: int) -> str:
+    # 視窗起點取到整天（UTC 00:00），同一天內重跑送出的請求完全相同
+    start = (now - dt.timedelta(days=window_days)).astimezone(dt.timezone.utc)
+    return rfc3339(start.replace(hour=0, minute=0, second=0, microsecond=0))
+
+
+# -----------------------
+# 抓取（兩波）
+# - 第一波：所有超商的 search.list 同時送出（每家一個請求）
+# - 第二波：所有搜尋結果的影片 id 去重後，每 50 個併成一個 videos.list，同時送出
+# - 不論影片幾支，總共只要「店家數 + ceil(影片數 / 50)」個請求、兩個來回
+# -----------------------
+def search_params(query: str, api_key: str, published_after: str, max_results: int) -> dict:
+    return {
+        "part": "snippet",
+        "q": query,
+        "type": "video",
+        "order": "viewCount",
+        "publishedAfter": published_after,
+        "regionCode": "TW",
+        "relevanceLanguage": "zh-Hant",
+        "maxResults": max_results,
+        "key": api_key,
+    }
+
+
+def search_store(client: APIClient, query: str, api_key: str, published_after: str,
+                 max_results: int) -> list[str]:
+    data = client.get_json("search", search_params(query, api_key, published_after, max_results))
+    return [item["id"]["videoId"] for item in data.get("items", []) if item.get("id", {}).get("videoId")]
+
+
+def videos_params(ids: list[str], api_key: str) -> dict:
+    return {"part": "snippet,contentDetails", "id": ",".join(ids), "maxResults": len(ids), "key": api_key}
+
+
+def fetch_video_batch(client: APIClient, ids: list[str], api_key: str) -> list[dict]:
+    return client.get_json("videos", videos_params(ids, api_key), cacheable=False).get("items", [])
+
+
+def fetch_all(client: APIClient, api_key: str, now: dt.datetime, stores: dict[str, str] = STORE_QUERIES,
+              window_days: int = DEFAULT_WINDOW_DAYS, max_results: int = DEFAULT_MAX_RESULTS,
+              workers: int = 4) -> dict[str, list[dict]]:
+    published_after = window_start(now, window_days)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        found = dict(zip(stores, ex.map(
+            lambda q: search_store(client, q, api_key, published_after, max_results), stores.values()
+        )))
+
+        unique_ids = list(dict.fromkeys(vid for ids in found.values() for vid in ids))
+        details = {vid: video_record(item) for vid, item in client.cached_videos(unique_ids).items()}
+        missing = [vid for vid in unique_ids if vid not in details]
+        batches = [missing[i:i + VIDEOS_BATCH] for i in range(0, len(missing), VIDEOS_BATCH)]
+        for items in ex.map(lambda b: fetch_video_batch(client, b, api_key), batches):
+            client.store_videos(items)
+            details.update((item["id"], video_record(item)) for item in items)
+    if client.cache is not None and not client.offline:  # 重播不改動快取
+        client.cache.save_videos(published_after, keep=unique_ids)
+
+    # 與原本的 youtube.json 一致：每家依 publishedAt 由新到舊
+    return {
+        store: sorted((details[vid] for vid in ids if vid in details), key=lambda v: v["publishedAt"], reverse=True)
+        for store, ids in found.items()
+    }
+
+
+# -----------------------
+# 增量合併到 data/youtube.json
+# - 每家的清單維持 publishedAt 由新到舊（同秒再依影片 id），以 url 裡的影片 id 去重
+# - 新影片用二分搜尋找到位置再插入；已存在的影片內容有變才換掉
+# - 滾動視窗：早於視窗起點的影片一定在清單尾端，從尾端 pop 掉
+# - 成本是 O(總筆數)：整份 JSON 本來就要讀進來，既有清單再掃一次建 id 索引、檢查排序
+#   （擋手動編輯造成的重複 / 亂序），最後跟原內容比一次決定要不要寫檔；
+#   每支新影片另外是一次二分搜尋 + list.insert。清單只留視窗內的影片（每家幾十支），不另外做索引檔
+# - 合併結果與原本內容相同就不寫檔，每晚的 git commit 只有真的有變動時才出現
+# -----------------------
+def _order_key(video: dict) -> tuple[str, str]:
+    return video.get("publishedAt", ""), video_id_from_url(video.get("url", "")) or ""
+
+
+def _insert_position(videos: list[dict], key: tuple[str, str]) -> int:
+    # 由新到舊排序的清單裡，第一個 order_key <= key 的位置
+    lo, hi = 0, len(videos)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if _order_key(videos[mid]) > key:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def merge_store_videos(current: list[dict], fetched: list[dict], cutoff: str) -> list[dict]:
+    videos = list(current)
+    by_id: dict[str, dict] = {}
+    for v in videos:
+        by_id.setdefault(video_id_from_url(v.get("url", "")) or v.get("url", ""), v)
+    if len(by_id) != len(videos) or any(_order_key(a) < _order_key(b) for a, b in zip(videos, videos[1:])):
+        # 手動編輯過（重複或順序亂了）：整理一次，之後都是增量
+        videos = sorted(by_id.values(), key=_order_key, reverse=True)
+
+    for v in fetched:
+        vid = video_id_from_url(v.get("url", ""))
+        if vid is None:
+            continue
+        old = by_id.get(vid)
+        if old == v:
+            continue
+        if old is not None:
+            del videos[_insert_position(videos, _order_key(old))]
+        videos.insert(_insert_position(videos, _order_key(v)), v)
+        by_id[vid] = v
+
+    while videos and videos[-1].get("publishedAt", "") < cutoff:
+        videos.pop()
+    return videos
+
+
+def merge_youtube_data(path: Path, fetched: dict[str, list[dict]], cutoff: str) -> bool:
+    # 回傳是否真的寫了檔
+    try:
+        current = json.loads(path.read_text(encoding="utf-8-sig"))
+    except FileNotFoundError:
+        current = {}
+    stores = list(current) + [s for s in fetched if s not in current]
+    merged = {store: merge_store_videos(current.get(store, []), fetched.get(store, []), cutoff)
+              for store in stores}
+    if merged == current:
+        return False
+    write_json_atomic(path, merged)
+    return True
+
+
+# -----------------------
+# 主程式
+# -----------------------
+def parse_now(text: str | None) -> dt.datetime:
+    if not text:
+        return dt.datetime.now(dt.timezone.utc)
+    ts = dt.datetime.fromisoformat(text.replace("Z", "+00:00"))
+    return ts if ts.tzinfo else ts.replace(tzinfo=dt.timezone.utc)
+
+
+def main():
+    root = Path(__file__).resolve().parent.parent
+    ap = argparse.ArgumentParser(description="抓取各超商的 YouTube 熱門影片，寫成 data/youtube.json")
+    ap.add_argument("--out", default=str(root / "data" / "youtube.json"))
+    ap.add_argument("--api-key", default=os.environ.get("YOUTUBE_API_KEY"))
+    ap.add_argument("--api-base", default=os.environ.get("YOUTUBE_API_BASE", API_BASE),
+                    help="API 位址；離線測試時指向 youtube_stub.py")
+    ap.add_argument("--max-results", type=int, default=DEFAULT_MAX_RESULTS, help="每家超商最多幾支影片")
+    ap.add_argument("--window-days", type=int, default=DEFAULT_WINDOW_DAYS, help="只搜尋最近幾天發佈的影片")
+    ap.add_argument("--workers", type=int, default=len(STORE_QUERIES), help="同時在飛的請求數（連線池大小）")
+    ap.add_argument("--now", help="固定「現在」時間（ISO 8601），重播錄製的回應時用")
+    ap.add_argument("--cache-dir", default=os.environ.get("YOUTUBE_CACHE_DIR"),
+                    help="回應快取資料夾：條件式請求、影片細節快取、配額紀錄（responses/ 可給 youtube_stub.py 重播）")
+    ap.add_argument("--cache-max-age", type=float, default=0,
+                    help="快取多新（秒）以內直接使用、不發請求；預設 0 = 每次都送條件式請求")
+    ap.add_argument("--offline", action="store_true", help="不連網，只從 --cache-dir 重播（測試 / 壓測用）")
+    ap.add_argument("--replace", action="store_true",
+                    help="用這次抓到的結果整份覆蓋 --out（預設是合併進既有清單、淘汰視窗外的影片）")
+    args = ap.parse_args()
+
+    if args.offline and not args.cache_dir:
+        ap.error("--offline 需要 --cache-dir")
+    if not args.offline and not args.api_key and args.api_base == API_BASE:
+        ap.error("需要 --api-key 或環境變數 YOUTUBE_API_KEY")
+
+    t0 = time.perf_counter()
+    now = parse_now(args.now)
+    pool = None if args.offline else HTTPPool(args.api_base, size=args.workers)
+    cache = ResponseCache(Path(args.cache_dir)) if args.cache_dir else None
+    client = APIClient(pool, cache, offline=args.offline, max_age=args.cache_max_age)
+    try:
+        data = fetch_all(client, args.api_key or "", now,
+                         window_days=args.window_days, max_results=args.max_results, workers=args.workers)
+    except (YouTubeAPIError, OSError, http.client.HTTPException) as e:
+        print(f"抓取失敗：{e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if pool is not None:
+            pool.close()
+
+    out = Path(args.out)
+    if args.replace:
+        write_json_atomic(out, data)
+        written = True
+    else:
+        written = merge_youtube_data(out, data, window_start(now, args.window_days))
+    stats = {**client.stats, "connections": pool.connections if pool else 0,
+             "seconds": round(time.perf_counter() - t0, 3)}
+    if cache is not None and not args.offline:
+        cache.log_run({"ts": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"), **stats})
+    counts = ", ".join(f"{store}={len(videos)}" for store, videos in data.items())
+    print(f"OK: {args.out} ({'updated' if written else 'unchanged, not rewritten'}; fetched {counts})")
+    print("Requests: {requests} sent ({not_modified} not modified), {cache_hits} served from cache, "
+          "{videos_from_cache} video details cached; quota {quota_units} units "
+          "(<= {quota_units_max} if 304s are billed); {connections} connections, {seconds}s".format(**stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,20 +2,203 @@ from __future__ import annotations
 
 import argparse
 import datetime as dt
+import functools
+import hashlib
+import importlib.util
+import io
+import json
+import os
 import re
+import sys
+import time
+import zipfile
+from array import array
 from collections import Counter
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager, nullcontext
+from itertools import islice
 from pathlib import Path
+from xml.etree import ElementTree as ET
+from html import escape as html_escape
 
-import yaml
-from docx import Document
+# yaml / docx（連帶 lxml）、process pool 都很重，只在真的用到的階段才 import：
+# --help、notes 快取命中、模板快取命中都不需要付這個成本
 
 
 # -----------------------
 # 讀取模板（任務規格）
+# - 解析後的 dict 以 JSON 存在模板旁的 __pycache__/，用 mtime + 檔案大小判斷是否過期
+# - 不用 pickle：能改到快取檔的人不該因此能在產生器 / 常駐服務裡執行程式；載入 JSON 跟 yaml.safe_load 一樣安全
+# - YAML 的日期 / 時間以 {"$date": ...} / {"$datetime": ...} 標記存；其他 JSON 存不回原樣的
+#   （整數 key、NaN…）寫入前先試一次來回，不一致就不快取
+# - 命中時不用 import yaml，也不用重新 parse
 # -----------------------
-def load_template(template_path: Path) -> dict:
+def _template_cache_path(template_path: Path) -> Path:
+    return template_path.parent / "__pycache__" / f"{template_path.name}.json"
+
+
+def _encode_template_value(value):
+    if isinstance(value, dt.datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, dt.date):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"無法快取的型別：{type(value).__name__}")
+
+
+def _decode_template_value(obj: dict):
+    if len(obj) == 1:
+        if "$datetime" in obj:
+            return dt.datetime.fromisoformat(obj["$datetime"])
+        if "$date" in obj:
+            return dt.date.fromisoformat(obj["$date"])
+    return obj
+
+
+def load_template(template_path: Path) -> CompiledTemplate:
+    return compile_template(load_template_dict(template_path))
+
+
+def load_template_dict(template_path: Path) -> dict:
+    st = template_path.stat()
+    cache_path = _template_cache_path(template_path)
+    try:
+        cached = json.loads(cache_path.read_bytes(), object_hook=_decode_template_value)
+        if cached["mtime_ns"] == st.st_mtime_ns and cached["size"] == st.st_size:
+            return cached["template"]
+    except (OSError, ValueError, TypeError, KeyError):
+        pass
+
+    import yaml
+
     with template_path.open("r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+        template = yaml.safe_load(f)
+
+    try:
+        body = json.dumps({"mtime_ns": st.st_mtime_ns, "size": st.st_size, "template": template},
+                          ensure_ascii=False, allow_nan=False, default=_encode_template_value)
+        if json.loads(body, object_hook=_decode_template_value)["template"] != template:
+            return template  # JSON 存不回原樣（例如整數 key）：不快取
+    except (TypeError, ValueError):
+        return template
+
+    tmp = cache_path.with_name(f".{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        cache_path.parent.mkdir(exist_ok=True)
+        tmp.write_text(body, encoding="utf-8")
+        os.replace(tmp, cache_path)
+    except OSError:  # 唯讀目錄：不快取，照樣回傳
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+    return template
+
+
+# -----------------------
+# 編譯後的模板
+# - 載入時一次檢查 schema、補預設值，之後各階段直接讀屬性，不再每次翻 dict
+# - v1.0：structure.required_terms（清單）；v1.1：structure.required_terms_rule（min/max）
+# - 建好之後不可修改；pickle 時只帶原始 dict，送進 process pool 後再編譯一次
+# -----------------------
+DEFAULT_TEMPLATE_TITLE = "任務一｜主題白話理解"
+
+
+class CompiledTemplate:
+    __slots__ = (
+        "id", "version", "title", "paragraphs", "snapshot",
+        "has_terms_rule", "min_terms", "max_terms", "required_terms",
+        "filename_pattern", "formats", "site_index", "validator", "_raw",
+    )
+
+    def __init__(self, raw: dict):
+        if not isinstance(raw, dict):
+            raise ValueError("模板格式錯誤：最外層必須是 mapping")
+        structure = raw.get("structure")
+        output = raw.get("output")
+        if not isinstance(structure, dict) or not isinstance(output, dict):
+            raise ValueError("模板格式錯誤：缺少 structure 或 output")
+
+        paragraphs = structure.get("paragraphs")
+        if not isinstance(paragraphs, int) or paragraphs < 1:
+            raise ValueError("模板格式錯誤：structure.paragraphs 必須是正整數")
+        snapshot = (structure.get("required_section_starter") or {}).get("snapshot")
+        if not isinstance(snapshot, str) or not snapshot:
+            raise ValueError("模板格式錯誤：缺少 structure.required_section_starter.snapshot")
+
+        rule = structure.get("required_terms_rule")
+        if rule is not None and not isinstance(rule, dict):
+            raise ValueError("模板格式錯誤：required_terms_rule 必須是 mapping")
+        try:
+            min_terms = int((rule or {}).get("min_terms", 3))
+            max_terms = int((rule or {}).get("max_terms", 8))
+        except (TypeError, ValueError):
+            raise ValueError("模板格式錯誤：min_terms / max_terms 必須是整數") from None
+        if min_terms < 0 or max_terms < min_terms:
+            raise ValueError("模板格式錯誤：需要 0 <= min_terms <= max_terms")
+
+        required_terms = structure.get("required_terms", [])
+        if not isinstance(required_terms, list) or not all(isinstance(t, str) for t in required_terms):
+            raise ValueError("模板格式錯誤：required_terms 必須是字串清單")
+
+        filename_pattern = output.get("filename_pattern")
+        if not isinstance(filename_pattern, str) or not filename_pattern:
+            raise ValueError("模板格式錯誤：缺少 output.filename_pattern")
+
+        fmt = output.get("format", "docx")
+        formats = (fmt,) if isinstance(fmt, str) else tuple(fmt)
+        unknown = [f for f in formats if f not in _OUTPUT_SUFFIXES]
+        if unknown:
+            raise ValueError(f"不支援的輸出格式：{unknown}")
+
+        values = {
+            "id": raw.get("id"),
+            "version": str(raw.get("version", "")),
+            "title": raw.get("name", DEFAULT_TEMPLATE_TITLE),
+            "paragraphs": paragraphs,
+            "snapshot": snapshot,
+            "has_terms_rule": bool(rule),
+            "min_terms": min_terms,
+            "max_terms": max_terms,
+            "required_terms": tuple(required_terms),
+            "filename_pattern": filename_pattern,
+            "formats": formats,
+            "site_index": output.get("site_index"),
+            "_raw": raw,
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, "validator", StoryValidator(self))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledTemplate 不可修改")
+
+    def __reduce__(self):
+        return (CompiledTemplate, (self._raw,))
+
+    # 相容舊的 dict 寫法（template["output"]、template.get("name")）
+    def __getitem__(self, key):
+        return self._raw[key]
+
+    def get(self, key, default=None):
+        return self._raw.get(key, default)
+
+    def __repr__(self) -> str:
+        return f"CompiledTemplate(id={self.id!r}, version={self.version!r})"
+
+
+_COMPILED: dict[int, tuple[dict, CompiledTemplate]] = {}
+
+
+def compile_template(template: CompiledTemplate | dict) -> CompiledTemplate:
+    if isinstance(template, CompiledTemplate):
+        return template
+    # 舊呼叫端還是傳 dict：以物件 id 快取；同時握住 dict，id 不會被別的 dict 重用
+    cached = _COMPILED.get(id(template))
+    if cached is None or cached[0] is not template:
+        if len(_COMPILED) >= 64:
+            _COMPILED.clear()
+        cached = _COMPILED[id(template)] = (template, CompiledTemplate(template))
+    return cached[1]
 
 
 # -----------------------
@@ -24,10 +207,99 @@ def load_template(template_path: Path) -> dict:
 def read_docx_paragraphs(source_path: Path) -> list[str]:
     if source_path.suffix.lower() != ".docx":
         raise ValueError(f"目前只支援 docx，收到：{source_path.suffix}")
+    from docx import Document
+
     doc = Document(str(source_path))
     return [p.text.strip() for p in doc.paragraphs if p.text and p.text.strip()]
 
 
+# -----------------------
+# 串流讀取 docx（大型全系列書用）
+# - 直接從 zip 逐段 inflate word/document.xml，用 iterparse 一段一段吐出
+# - 每處理完一個 body 子元素就清掉，記憶體只跟「最大的一段」有關
+# - 文字規則對齊 python-docx 的 Paragraph.text（w:r / w:hyperlink 底下的 run）
+# - 找不到主文件 part 時退回 read_docx_paragraphs
+# -----------------------
+_W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_W = "{" + _W_NS + "}"
+_PKG_RELS_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_OFFICE_DOCUMENT_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+
+_RUN_TEXT_TAGS = {
+    _W + "tab": "\t",
+    _W + "ptab": "\t",
+    _W + "cr": "\n",
+    _W + "noBreakHyphen": "-",
+}
+
+
+def _find_main_document_part(zf: zipfile.ZipFile) -> str | None:
+    names = set(zf.namelist())
+    if "_rels/.rels" in names:
+        rels = ET.fromstring(zf.read("_rels/.rels"))
+        for rel in rels.iter(_PKG_RELS_NS + "Relationship"):
+            if rel.get("Type") == _OFFICE_DOCUMENT_REL:
+                target = rel.get("Target", "").lstrip("/")
+                if target in names:
+                    return target
+    return "word/document.xml" if "word/document.xml" in names else None
+
+
+def _run_text(r: ET.Element) -> str:
+    parts = []
+    for child in r:
+        tag = child.tag
+        if tag == _W + "t":
+            parts.append(child.text or "")
+        elif tag == _W + "br":
+            # 只有換行型 break 算 "\n"，分頁/分欄不算文字
+            if child.get(_W + "type", "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif tag in _RUN_TEXT_TAGS:
+            parts.append(_RUN_TEXT_TAGS[tag])
+    return "".join(parts)
+
+
+def _paragraph_text(p: ET.Element) -> str:
+    parts = []
+    for child in p:
+        if child.tag == _W + "r":
+            parts.append(_run_text(child))
+        elif child.tag == _W + "hyperlink":
+            parts.extend(_run_text(r) for r in child if r.tag == _W + "r")
+    return "".join(parts)
+
+
+def iter_docx_paragraphs(source_path: Path) -> Iterator[str]:
+    if source_path.suffix.lower() != ".docx":
+        raise ValueError(f"目前只支援 docx，收到：{source_path.suffix}")
+
+    with zipfile.ZipFile(source_path) as zf:
+        part = _find_main_document_part(zf)
+        if part is None:
+            yield from read_docx_paragraphs(source_path)
+            return
+
+        with zf.open(part) as f:
+            depth = 0
+            body = None
+            for event, elem in ET.iterparse(f, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if depth == 2 and elem.tag == _W + "body":
+                        body = elem
+                    continue
+
+                depth -= 1
+                # depth 2 = body 的直接子元素（段落 / 表格 / sectPr）
+                if depth == 2 and body is not None:
+                    if elem.tag == _W + "p":
+                        text = _paragraph_text(elem).strip()
+                        if text:
+                            yield text
+                    body.clear()
+
+
 # -----------------------
 # 判斷某段落是否「像程式碼」
 # 目的：把 code-heavy 段落先排除，避免抽到 const/if/for 這種 token
@@ -69,6 +341,36 @@ def looks_like_code(paragraph: str) -> bool:
     return False
 
 
+# -----------------------
+# 批次判斷 code 段落（結果與 looks_like_code 一致）
+# - 符號數改用 str.count 逐個符號數（C 層掃描），不再逐字元做 set 查找
+# - 便宜的規則先判，只有前面都沒中的段落才做 keyword tokenize
+# -----------------------
+_CODE_SYMBOL_CHARS = tuple(_CODE_SYMBOLS)
+_CODE_TOKEN_RE = re.compile(r"[A-Za-z_]\w*")
+
+
+def classify_paragraphs(paragraphs: Iterable[str]) -> list[bool]:
+    count_keyword = _CODE_KEYWORDS.__contains__
+    findall = _CODE_TOKEN_RE.findall
+    verdicts = []
+    for paragraph in paragraphs:
+        s = paragraph.strip()
+        n = len(s)
+        if not n:
+            verdicts.append(False)
+            continue
+
+        symbol_count = sum(map(s.count, _CODE_SYMBOL_CHARS))
+        if symbol_count and (n <= 25 or symbol_count / n >= 0.08):  # 規則 1、2
+            verdicts.append(True)
+        elif (s[0] == "{" and s[-1] == "}") or "```" in s:  # 規則 4
+            verdicts.append(True)
+        else:  # 規則 3
+            verdicts.append(sum(map(count_keyword, findall(s))) >= 2)
+    return verdicts
+
+
 # -----------------------
 # 抽取「技術名詞候選」（通用版，偏出版可用）
 # 策略：
@@ -123,21 +425,426 @@ def extract_terms_from_text(text: str, top_k: int = 12) -> list[str]:
     return uniq
 
 
-def extract_internal_notes(paragraphs: list[str]) -> dict:
-    prose_paras = [p for p in paragraphs if not looks_like_code(p)]
-    prose_text = "\n".join(prose_paras)
+# -----------------------
+# 單趟抽詞（大型書稿用）
+# - 不先把整本 join 成一個大字串，逐段丟給預先編譯好的 regex
+# - 原始 token 直接交給 Counter.update（C 層計數），分類只對「不重複的 token」做一次
+# - 結果與 extract_terms_from_text 完全相同（同頻時依首次出現順序）
+# -----------------------
+_TOKEN_RE = re.compile(r"[A-Za-z][A-Za-z0-9_\-\.]{1,}")
+_EXCLUDED_WORDS = frozenset(_STOP_WORDS | _BLACKLIST)
+
+
+def is_term_candidate(w: str) -> bool:
+    if len(w) < 3 or w.lower() in _EXCLUDED_WORDS:
+        return False
+    is_acronym = w.isupper() and len(w) <= 8
+    is_titlecase = w[0].isupper() and any(ch.islower() for ch in w[1:])
+    has_sep = ("-" in w) or ("." in w) or ("_" in w)
+    return is_acronym or is_titlecase or has_sep
+
+
+def count_raw_tokens(paragraphs: Iterable[str], counts: Counter | None = None) -> Counter:
+    # counts 有給時接著累加（分批計數用）；依段落順序 update，插入順序仍是首次出現順序
+    if counts is None:
+        counts = Counter()
+    findall = _TOKEN_RE.findall
+    for p in paragraphs:
+        counts.update(findall(p))
+    return counts
+
+
+def filter_term_candidates(raw_counts: Counter) -> Counter:
+    # dict 保留插入順序，過濾後同頻詞的先後仍是「首次出現順序」
+    return Counter({w: n for w, n in raw_counts.items() if is_term_candidate(w)})
+
+
+def _count_chunk_candidates(chunk: list[str]) -> tuple[Counter, int]:
+    raw = count_raw_tokens(chunk)
+    return filter_term_candidates(raw), sum(raw.values())
+
 
-    terms = extract_terms_from_text(prose_text, top_k=12)
+def count_term_candidates_parallel(paragraphs: list[str], workers: int) -> tuple[Counter, int]:
+    # 切成連續的段落區塊各自計數，再「依區塊順序」合併：
+    # 合併後的插入順序就是全文首次出現順序，不管幾個 worker 結果都一樣
+    n_chunks = min(len(paragraphs), workers * 4)
+    size = -(-len(paragraphs) // n_chunks)
+    chunks = [paragraphs[i:i + size] for i in range(0, len(paragraphs), size)]
+    from concurrent.futures import ProcessPoolExecutor
 
-    # 取一小段當 preview（純敘述段落）
-    preview_lines = prose_paras[:8]
+    merged: Counter = Counter()
+    raw_total = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for partial, raw_n in pool.map(_count_chunk_candidates, chunks):
+            merged.update(partial)
+            raw_total += raw_n
+    return merged, raw_total
+
+
+# -----------------------
+# 共用詞彙的平行計數（有 --corpus-index 時）
+# - worker 以 vocab_only 模式 mmap 開同一版詞頻索引當詞彙表（唯讀、共用 page cache）：
+#   只有字串 / offsets / 雜湊表 + delta 的新詞，不載入 docs.json、df，也不重播每本書的增減
+# - worker 內部仍是對自己那一塊用字串 Counter 計數，計完才把候選詞換成 id；
+#   用 id 的是回傳給主程式的資料與主程式的合併
+# - 每個區塊回傳 (id 陣列, 次數陣列, 詞彙表外的新詞)：IPC 只傳整數陣列，不再 pickle 整個字串 Counter
+# - 主程式用一條依 id 索引的計數陣列合併；新詞接在詞彙表後面給暫時 id
+# - 只有最後輸出時才把 id 換回字串；結果與 count_term_candidates_parallel 相同
+# -----------------------
+_WORKER_VOCAB = None
+
+
+def _init_vocab_worker(corpus_dir: str, snapshot: tuple[str, int]) -> None:
+    global _WORKER_VOCAB
+    from task01_corpus import CorpusIndex
+
+    _WORKER_VOCAB = CorpusIndex(Path(corpus_dir), snapshot, vocab_only=True)
+
+
+def _count_chunk_ids(chunk: list[str]) -> tuple[array, array, list[str], int]:
+    raw = count_raw_tokens(chunk)
+    n_vocab = _WORKER_VOCAB.n_terms
+    term_id = _WORKER_VOCAB.term_id
+    ids, counts = array("I"), array("I")
+    new_terms: list[str] = []
+    for w, n in raw.items():  # 首次出現順序
+        if not is_term_candidate(w):
+            continue
+        tid = term_id(w)
+        if tid is None:
+            tid = n_vocab + len(new_terms)
+            new_terms.append(w)
+        ids.append(tid)
+        counts.append(n)
+    return ids, counts, new_terms, sum(raw.values())
+
+
+def count_term_candidates_shared(paragraphs: list[str], workers: int, corpus_dir: Path) -> tuple[Counter, int]:
+    from concurrent.futures import ProcessPoolExecutor
+
+    from task01_corpus import CorpusIndex
+
+    n_chunks = min(len(paragraphs), workers * 4)
+    size = -(-len(paragraphs) // n_chunks)
+    chunks = [paragraphs[i:i + size] for i in range(0, len(paragraphs), size)]
+
+    with CorpusIndex(corpus_dir, vocab_only=True) as vocab:
+        n_vocab = vocab.n_terms
+        totals = array("I", [0]) * n_vocab
+        first_seen = array("I")
+        new_ids: dict[str, int] = {}
+        raw_total = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_vocab_worker,
+                                 initargs=(str(corpus_dir), vocab.snapshot)) as pool:
+            for ids, counts, new_terms, raw_n in pool.map(_count_chunk_ids, chunks):
+                remap = array("I")
+                for w in new_terms:
+                    gid = new_ids.get(w)
+                    if gid is None:
+                        gid = new_ids[w] = len(totals)
+                        totals.append(0)
+                    remap.append(gid)
+                for tid, n in zip(ids, counts):
+                    if tid >= n_vocab:
+                        tid = remap[tid - n_vocab]
+                    if not totals[tid]:
+                        first_seen.append(tid)
+                    totals[tid] += n
+                raw_total += raw_n
+
+        extra = list(new_ids)
+        merged = Counter({
+            (vocab.term(tid) if tid < n_vocab else extra[tid - n_vocab]): totals[tid] for tid in first_seen
+        })
+    return merged, raw_total
+
+
+def count_term_candidates(paragraphs: Iterable[str], workers: int = 1,
+                          corpus_dir: Path | None = None) -> tuple[Counter, int]:
+    # 回傳 (候選詞計數, 原始 token 總數)
+    if workers > 1:
+        paragraphs = list(paragraphs)
+        if len(paragraphs) >= workers * 2:
+            if corpus_dir is not None and (corpus_dir / "CURRENT").exists():
+                return count_term_candidates_shared(paragraphs, workers, corpus_dir)
+            return count_term_candidates_parallel(paragraphs, workers)
+    return _count_chunk_candidates(paragraphs)
+
+
+def extract_terms(paragraphs: Iterable[str], top_k: int = 12, workers: int = 1) -> list[str]:
+    freq, _ = count_term_candidates(paragraphs, workers)
+    return [t for t, _ in freq.most_common(top_k)]
+
+
+def extract_internal_notes(paragraphs: Iterable[str], term_workers: int = 1,
+                           corpus_dir: Path | None = None) -> dict:
+    # paragraphs 可以是 list，也可以是 iter_docx_paragraphs 的 generator（只走一次）
+    # 分批判斷 code 段落、分批計數，generator 來源只需暫存一批，preview 只留前 8 段
+    # 平行計數（term_workers > 1）要切區塊分給 worker，才需要留下整份敘述段落
+    all_count = 0
+    prose_count = 0
+    preview_lines: list[str] = []
+    prose_paras: list[str] | None = [] if term_workers > 1 else None
+    raw_counts: Counter = Counter()
+    it = iter(paragraphs)
+    while batch := list(islice(it, 4096)):
+        all_count += len(batch)
+        prose = [p for p, is_code in zip(batch, classify_paragraphs(batch)) if not is_code]
+        prose_count += len(prose)
+        if len(preview_lines) < 8:
+            preview_lines.extend(prose[:8 - len(preview_lines)])
+        if prose_paras is not None:
+            prose_paras.extend(prose)
+        else:
+            count_raw_tokens(prose, raw_counts)
+    if prose_paras is not None:
+        freq, raw_token_count = count_term_candidates(prose_paras, workers=term_workers, corpus_dir=corpus_dir)
+    else:
+        freq, raw_token_count = filter_term_candidates(raw_counts), sum(raw_counts.values())
+    # 完整候選詞計數（依次數、同次數依首次出現排序）；跨書 TF-IDF 排名用
+    term_counts = freq.most_common()
+    terms = [t for t, _ in term_counts[:12]]
 
     return {
         "observed_terms": terms,
         "preview": "\n".join(preview_lines),
-        "prose_count": len(prose_paras),
-        "all_count": len(paragraphs)
+        "prose_count": prose_count,
+        "all_count": all_count,
+        "raw_token_count": raw_token_count,
+        "candidate_count": sum(freq.values()),
+        "term_counts": [[t, n] for t, n in term_counts],
+    }
+
+
+# -----------------------
+# 增量抽取（作者只改幾段時用）
+# - 每段存 fingerprint → [是否 code, 該段候選詞計數（依首次出現順序）, 原始 token 數]
+# - 新版本只對「沒看過的段落」做分類與 tokenize，總計數用段落出現次數的差值加減
+# - 同頻詞的先後依全文首次出現順序，從段落順序回推，結果與完整重算相同
+# -----------------------
+def paragraph_fingerprint(paragraph: str) -> str:
+    return hashlib.blake2b(paragraph.encode("utf-8"), digest_size=12).hexdigest()
+
+
+def _paragraph_record(paragraph: str) -> list:
+    is_code = classify_paragraphs([paragraph])[0]
+    if is_code:
+        return [True, [], 0]
+    tokens = _TOKEN_RE.findall(paragraph)
+    raw = Counter(tokens)
+    return [False, [[w, n] for w, n in raw.items() if is_term_candidate(w)], len(tokens)]
+
+
+def _ordered_term_counts(counts: dict, order: list[str], records: dict) -> list[tuple[str, int]]:
+    # 依次數排序，同次數依全文首次出現順序（與 Counter.most_common 相同）
+    cand = {w: n for w, n in counts.items() if n > 0}
+    seen: dict[str, None] = {}
+    for fp in order:
+        is_code, tokens, _ = records[fp]
+        if is_code:
+            continue
+        for w, _ in tokens:
+            if w in cand and w not in seen:
+                seen[w] = None
+        if len(seen) == len(cand):
+            break
+    return [(w, cand[w]) for w in sorted(seen, key=lambda w: -cand[w])]
+
+
+def extract_internal_notes_incremental(paragraphs: Iterable[str], state: dict | None,
+                                       top_k: int = 12) -> tuple[dict, dict]:
+    if not state or state.get("version") != extractor_version():
+        state = {"records": {}, "order": [], "counts": {}, "raw_token_count": 0}
+    old_records: dict = state["records"]
+    old_occ = Counter(state["order"])
+
+    records: dict = {}
+    order: list[str] = []
+    preview_lines: list[str] = []
+    prose_count = 0
+    for p in paragraphs:
+        fp = paragraph_fingerprint(p)
+        rec = records.get(fp)
+        if rec is None:
+            rec = old_records.get(fp)
+            if rec is None:
+                rec = _paragraph_record(p)  # 只有新段落才真的分析
+            records[fp] = rec
+        order.append(fp)
+        if not rec[0]:
+            prose_count += 1
+            if len(preview_lines) < 8:
+                preview_lines.append(p)
+
+    # 依段落出現次數的變化調整總計數
+    counts = dict(state["counts"])
+    raw_token_count = state["raw_token_count"]
+    new_occ = Counter(order)
+    for fp in old_occ.keys() | new_occ.keys():
+        delta = new_occ[fp] - old_occ[fp]
+        if not delta:
+            continue
+        rec = records.get(fp) or old_records[fp]
+        raw_token_count += delta * rec[2]
+        for w, n in rec[1]:
+            total = counts.get(w, 0) + delta * n
+            if total:
+                counts[w] = total
+            else:
+                counts.pop(w, None)
+
+    term_counts = _ordered_term_counts(counts, order, records)
+    notes = {
+        "observed_terms": [w for w, _ in term_counts[:top_k]],
+        "preview": "\n".join(preview_lines),
+        "prose_count": prose_count,
+        "all_count": len(order),
+        "raw_token_count": raw_token_count,
+        "candidate_count": sum(counts.values()),
+        "term_counts": [[w, n] for w, n in term_counts],
     }
+    new_state = {"version": extractor_version(), "records": records, "order": order, "counts": counts,
+                 "raw_token_count": raw_token_count}
+    return notes, new_state
+
+
+# -----------------------
+# notes 快取（content-addressed）
+# - key = 來源檔 bytes 的 sha256 + 抽取器版本（詞表 + 抽取程式碼）
+# - 命中時完全不解析 docx；改詞表或改抽取邏輯會自動換 key
+# - 每筆一個 JSON 檔，命中時 touch mtime，超過容量從最舊的開始刪（LRU）
+# - miss 時走增量抽取，段落狀態（para-*.json）也放在同一個快取裡
+# -----------------------
+NOTES_CACHE_SCHEMA = 1
+DEFAULT_NOTES_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+@functools.cache
+def extractor_version() -> str:
+    import inspect
+
+    h = hashlib.sha256(f"schema={NOTES_CACHE_SCHEMA}".encode())
+    for words in (_STOP_WORDS, _BLACKLIST, _CODE_KEYWORDS, _CODE_SYMBOLS):
+        h.update("\x00".join(sorted(words)).encode("utf-8"))
+        h.update(b"\x01")
+    # 函式裡用的是模組層級預先編譯的 regex，改 pattern 不會反映在原始碼上，要另外算進來
+    for pattern in (_TOKEN_RE, _CODE_TOKEN_RE):
+        h.update(pattern.pattern.encode("utf-8") + b"\x02" + str(pattern.flags).encode() + b"\x01")
+    for fn in (_run_text, _paragraph_text, iter_docx_paragraphs, classify_paragraphs,
+               is_term_candidate, count_raw_tokens, filter_term_candidates,
+               extract_terms, extract_internal_notes,
+               # --notes-cache 走的增量路徑：notes 與 para-*.json 段落狀態都由這幾個產生
+               paragraph_fingerprint, _paragraph_record, _ordered_term_counts,
+               extract_internal_notes_incremental):
+        try:
+            h.update(inspect.getsource(fn).encode("utf-8"))
+        except (OSError, TypeError):  # 沒有原始碼可讀（例如打包後），退回 bytecode
+            h.update(fn.__code__.co_code)
+    return h.hexdigest()[:16]
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1024 * 1024):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def notes_cache_key(source_path: Path) -> str:
+    return f"{file_sha256(source_path)}-{extractor_version()}"
+
+
+def load_cached_notes(cache_dir: Path, key: str) -> dict | None:
+    entry = cache_dir / f"{key}.json"
+    try:
+        with entry.open("r", encoding="utf-8") as f:
+            notes = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    try:
+        os.utime(entry)  # LRU：最近用過的往後排
+    except OSError:
+        pass
+    return notes
+
+
+def store_cached_notes(cache_dir: Path, key: str, notes: dict,
+                       max_bytes: int = DEFAULT_NOTES_CACHE_MAX_BYTES) -> None:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    entry = cache_dir / f"{key}.json"
+    # 先寫暫存檔再 replace，批次多 process 同時寫也不會讀到半個檔
+    tmp = entry.with_name(f".{entry.name}.{os.getpid()}.tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(notes, f, ensure_ascii=False)
+    os.replace(tmp, entry)
+    evict_notes_cache(cache_dir, max_bytes)
+
+
+def evict_notes_cache(cache_dir: Path, max_bytes: int) -> None:
+    entries = []
+    total = 0
+    for e in os.scandir(cache_dir):
+        if not e.name.endswith(".json"):
+            continue
+        try:
+            st = e.stat()
+        except FileNotFoundError:  # 其他 process 剛刪掉
+            continue
+        entries.append((st.st_mtime, st.st_size, e.path))
+        total += st.st_size
+    if total <= max_bytes:
+        return
+    for _, size, path in sorted(entries):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        if total <= max_bytes:
+            break
+
+
+def get_internal_notes(source_path: Path, cache_dir: Path | None = None,
+                       max_bytes: int = DEFAULT_NOTES_CACHE_MAX_BYTES, term_workers: int = 1,
+                       source_id: str | None = None, corpus_dir: Path | None = None) -> dict:
+    if cache_dir is None:
+        return extract_internal_notes(iter_docx_paragraphs(source_path), term_workers=term_workers,
+                                      corpus_dir=corpus_dir)
+
+    key = notes_cache_key(source_path)
+    notes = load_cached_notes(cache_dir, key)
+    if notes is None:
+        # 同一份書稿（預設以路徑識別）的上一版段落狀態：有的話只重算改過的段落
+        source_id = source_id or str(source_path.resolve())
+        state_key = "para-" + hashlib.sha256(source_id.encode("utf-8")).hexdigest()[:32]
+        state = load_cached_notes(cache_dir, state_key)
+        notes, state = extract_internal_notes_incremental(iter_docx_paragraphs(source_path), state)
+        store_cached_notes(cache_dir, state_key, state, max_bytes)
+        store_cached_notes(cache_dir, key, notes, max_bytes)
+    return notes
+
+
+# -----------------------
+# 跨書 TF-IDF（--corpus-index）
+# - 每本書的候選詞集合增量併進全書庫的 document frequency 索引（見 task01_corpus.py）
+# - observed_terms 改依 tf × idf 排序：每本書都常見的泛用詞往後排，這本書特有的詞往前
+# -----------------------
+def corpus_doc_key(author: str, book: str) -> str:
+    return f"{author}/{book}"
+
+
+def rank_terms_tfidf(notes: dict, corpus_dir: Path, doc_key: str, top_k: int = 12,
+                     update: bool = True) -> dict:
+    from task01_corpus import CorpusIndex, update_corpus
+
+    counts = dict(notes.get("term_counts", []))
+    if update:
+        update_corpus(corpus_dir, doc_key, counts)
+    with CorpusIndex(corpus_dir) as index:
+        ranked = index.rank(counts, top_k)
+    # notes 可能來自快取，不改原物件
+    return {**notes, "observed_terms": ranked}
 
 
 # -----------------------
@@ -146,10 +853,10 @@ def extract_internal_notes(paragraphs: list[str]) -> dict:
 # - 技術名詞以「角色」分散嵌入
 # - 四段敘事：情境 → 角色與主線 → 協作流程 → 快照收斂
 # -----------------------
-def pick_terms_for_story(template: dict, notes: dict) -> list[str]:
-    rule = template["structure"].get("required_terms_rule", {"min_terms": 3, "max_terms": 8})
-    min_terms = int(rule.get("min_terms", 3))
-    max_terms = int(rule.get("max_terms", 8))
+def pick_terms_for_story(template: CompiledTemplate | dict, notes: dict) -> list[str]:
+    template = compile_template(template)
+    min_terms = template.min_terms
+    max_terms = template.max_terms
 
     observed = notes.get("observed_terms", [])
     picked = observed[:max_terms]
@@ -164,7 +871,8 @@ def pick_terms_for_story(template: dict, notes: dict) -> list[str]:
     return picked
 
 
-def generate_task01_story(template: dict, notes: dict) -> list[str]:
+def generate_task01_story(template: CompiledTemplate | dict, notes: dict) -> list[str]:
+    template = compile_template(template)
     picked = pick_terms_for_story(template, notes)
 
     # 用 3~5 個詞做「角色嵌入」，但不列成清單
@@ -203,7 +911,7 @@ def generate_task01_story(template: dict, notes: dict) -> list[str]:
         )
 
     # 段 4：快照收斂（你最重視的那句）
-    snapshot_starter = template["structure"]["required_section_starter"]["snapshot"]
+    snapshot_starter = template.snapshot
     p4 = (
         f"{snapshot_starter}：你腦中只要留下這張快照——"
         f"『這本書會用 {t1} 把主線定清楚，用 {t2} 把路徑拆開，"
@@ -220,14 +928,15 @@ def generate_task01_story(template: dict, notes: dict) -> list[str]:
 # - 技術名詞命中數（依規則）
 # - 禁止 keyword dump（出現「：A、B、C」這種直接判失敗）
 # -----------------------
-def validate_story(template: dict, notes: dict, paragraphs: list[str]) -> None:
-    if len(paragraphs) != template["structure"]["paragraphs"]:
+def validate_story(template: CompiledTemplate | dict, notes: dict, paragraphs: list[str]) -> None:
+    template = compile_template(template)
+    if len(paragraphs) != template.paragraphs:
         raise ValueError("段落數不符合模板要求")
 
     joined = "\n".join(paragraphs)
 
     # 快照句檢核
-    snapshot = template["structure"]["required_section_starter"]["snapshot"]
+    snapshot = template.snapshot
     if snapshot not in joined:
         raise ValueError("缺少快照收斂段落的固定開頭")
 
@@ -236,20 +945,60 @@ def validate_story(template: dict, notes: dict, paragraphs: list[str]) -> None:
         raise ValueError("偵測到關鍵字清單式輸出（keyword dump），不符合敘事要求")
 
     # 技術名詞數量檢核（通用規則）
-    rule = template["structure"].get("required_terms_rule")
-    if rule:
-        min_terms = int(rule.get("min_terms", 3))
-        max_terms = int(rule.get("max_terms", 8))
+    if template.has_terms_rule:
+        min_terms = template.min_terms
+        max_terms = template.max_terms
         observed = notes.get("observed_terms", [])
         hit = [t for t in observed[:max_terms] if t in joined]
         if len(hit) < min_terms:
             raise ValueError(f"技術名詞出現不足：需要至少 {min_terms} 個，實際只有 {len(hit)} 個")
 
 
+# -----------------------
+# 檢核（快速版，判定與錯誤訊息跟 validate_story 相同）
+# - 模板規則在 CompiledTemplate 建立時就解析好（StoryValidator），不用每次查 dict
+# - keyword dump 的 regex 先編好；名詞命中照舊用 `in`（C 層子字串搜尋，故事只有幾段，比自動機快）
+# -----------------------
+_KEYWORD_DUMP_RE = re.compile(r"：[^。\n]{0,50}(、|,).+(、|,).+")
+
+
+class StoryValidator:
+    __slots__ = ("paragraphs", "snapshot", "min_terms", "max_terms")
+
+    def __init__(self, template: CompiledTemplate):
+        self.paragraphs = template.paragraphs
+        self.snapshot = template.snapshot
+        self.min_terms = template.min_terms if template.has_terms_rule else None
+        self.max_terms = template.max_terms if template.has_terms_rule else None
+
+    def __call__(self, notes: dict, paragraphs: list[str]) -> None:
+        if len(paragraphs) != self.paragraphs:
+            raise ValueError("段落數不符合模板要求")
+
+        joined = "\n".join(paragraphs)
+
+        if self.snapshot not in joined:
+            raise ValueError("缺少快照收斂段落的固定開頭")
+
+        if _KEYWORD_DUMP_RE.search(joined):
+            raise ValueError("偵測到關鍵字清單式輸出（keyword dump），不符合敘事要求")
+
+        if self.min_terms is not None:
+            hit = len([t for t in notes.get("observed_terms", [])[:self.max_terms] if t in joined])
+            if hit < self.min_terms:
+                raise ValueError(f"技術名詞出現不足：需要至少 {self.min_terms} 個，實際只有 {hit} 個")
+
+
+def validate_story_fast(template: CompiledTemplate | dict, notes: dict, paragraphs: list[str]) -> None:
+    compile_template(template).validator(notes, paragraphs)
+
+
 # -----------------------
 # 輸出 Word
 # -----------------------
 def write_docx(title: str, paragraphs: list[str], output_path: Path) -> None:
+    from docx import Document
+
     doc = Document()
     doc.add_heading(title, level=1)
     for p in paragraphs:
@@ -258,38 +1007,712 @@ def write_docx(title: str, paragraphs: list[str], output_path: Path) -> None:
     doc.save(str(output_path))
 
 
+# -----------------------
+# 快速輸出 Word（不經過 python-docx）
+# - 直接用 python-docx 內建的 default.docx 當骨架：除了 word/document.xml 以外的
+#   part（styles、theme、rels…）只在第一次壓成 zip 骨架，之後每份輸出直接複製
+# - 每份輸出只需要把 document.xml 串出來 append 進 zip
+# - 段落 XML 跟 python-docx 的 add_heading / add_paragraph 產生的一樣
+#   （\t → w:tab、\n/\r → w:br、前後有空白的 w:t 加 xml:space="preserve"）
+# -----------------------
+_DOCUMENT_PART = "word/document.xml"
+
+
+def _default_docx_template() -> Path:
+    # 只找檔案位置，不 import docx（不用載入 lxml）
+    spec = importlib.util.find_spec("docx")
+    if spec is None or not spec.submodule_search_locations:
+        raise RuntimeError("找不到 python-docx 的預設模板（請先 pip install python-docx）")
+    return Path(next(iter(spec.submodule_search_locations))) / "templates" / "default.docx"
+
+
+@functools.cache
+def _docx_skeleton() -> tuple[bytes, bytes, bytes]:
+    # 回傳 (不含 document.xml 的 zip 骨架, document.xml 開頭到 <w:body>, sectPr 到結尾)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(_default_docx_template()) as src, \
+            zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            if info.filename == _DOCUMENT_PART:
+                document_xml = src.read(info).decode("utf-8")
+                continue
+            dst.writestr(info.filename, src.read(info))
+    body_start = document_xml.index("<w:body>") + len("<w:body>")
+    sect_start = document_xml.index("<w:sectPr", body_start)
+    return (
+        buf.getvalue(),
+        document_xml[:body_start].encode("utf-8"),
+        document_xml[sect_start:].encode("utf-8"),
+    )
+
+
+def _xml_escape(text: str) -> str:
+    # 同 xml.sax.saxutils.escape；那個模組會連帶 import urllib.request / http.client，啟動成本太高
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _run_xml(text: str) -> str:
+    parts = []
+    segment = []
+
+    def flush():
+        if segment:
+            t = "".join(segment)
+            space = ' xml:space="preserve"' if len(t.strip()) < len(t) else ""
+            parts.append(f"<w:t{space}>{_xml_escape(t)}</w:t>")
+            segment.clear()
+
+    for ch in text:
+        if ch == "\t":
+            flush()
+            parts.append("<w:tab/>")
+        elif ch in "\n\r":
+            flush()
+            parts.append("<w:br/>")
+        else:
+            segment.append(ch)
+    flush()
+    return "<w:r>" + "".join(parts) + "</w:r>"
+
+
+def _paragraph_xml(text: str, style: str | None = None) -> str:
+    ppr = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+    run = _run_xml(text) if text else ""
+    return f"<w:p>{ppr}{run}</w:p>" if ppr or run else "<w:p/>"
+
+
+@functools.lru_cache(maxsize=64)
+def _heading_xml(title: str) -> bytes:
+    # 同一個模板的標題每次都一樣，渲染一次就好
+    return _paragraph_xml(title, "Heading1").encode("utf-8")
+
+
+def write_docx_fast(title: str, paragraphs: list[str], output_path: Path) -> None:
+    skeleton, doc_head, doc_tail = _docx_skeleton()
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with output_path.open("wb") as f:
+        f.write(skeleton)
+    with zipfile.ZipFile(output_path, "a", compression=zipfile.ZIP_DEFLATED) as zf:
+        with zf.open(_DOCUMENT_PART, "w") as out:
+            out.write(doc_head)
+            out.write(_heading_xml(title))
+            for p in paragraphs:
+                out.write(_paragraph_xml(p).encode("utf-8"))
+            out.write(doc_tail)
+
+
+# -----------------------
+# 多格式輸出（由 template["output"] 決定）
+# - output.format 可以是字串或清單：docx / json / html / md，同一次執行一起寫出
+# - 其他格式跟 docx 同檔名、只換副檔名
+# - output.site_index（相對 outdir）有設定時，順便更新網站讀的分片 index（見下方）
+# -----------------------
+_OUTPUT_SUFFIXES = {"docx": ".docx", "json": ".json", "html": ".html", "md": ".md"}
+
+
+def output_formats(template: CompiledTemplate | dict) -> list[str]:
+    return list(compile_template(template).formats)
+
+
+def render_story_json(title: str, story: list[str], meta: dict) -> str:
+    return json.dumps({"title": title, "paragraphs": story, **meta}, ensure_ascii=False, indent=2) + "\n"
+
+
+def render_story_html(title: str, story: list[str], meta: dict) -> str:
+    body = "\n".join(f"  <p>{html_escape(p)}</p>" for p in story)
+    return (
+        '<!doctype html>\n<html lang="zh-Hant">\n<head>\n  <meta charset="utf-8" />\n'
+        f"  <title>{html_escape(title)}</title>\n</head>\n<body>\n"
+        f"  <h1>{html_escape(title)}</h1>\n{body}\n</body>\n</html>\n"
+    )
+
+
+def render_story_markdown(title: str, story: list[str], meta: dict) -> str:
+    return f"# {title}\n\n" + "\n\n".join(story) + "\n"
+
+
+_TEXT_RENDERERS = {"json": render_story_json, "html": render_story_html, "md": render_story_markdown}
+
+
+def write_text_atomic(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+# -----------------------
+# 網站 index（分片）
+# - <index 目錄>/books/<作者__書名>.json   每本書一個小檔（故事 + 檔案連結）
+# - <index 目錄>/authors/<作者>.json       該作者的書目清單
+# - <index 目錄>/dates/<YYYY-MM-DD>.json   當天產生的書目清單
+# - index.json 本身只留根指標 + 最新一本的 content（task01.html 直接讀）
+# - 內容沒變的分片不重寫，nightly commit 只會帶到真的有變的檔案
+# - 批次多 process 同時更新時，用 index 目錄下的 .lock 串行化
+# -----------------------
+_UNSAFE_FILENAME_RE = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+SITE_INDEX_LAYOUT = "sharded-v1"
+
+
+def shard_name(text: str) -> str:
+    # 保留中文，只換掉檔名不能用的字元；前端用 encodeURIComponent(名稱) + ".json" 即可取得
+    return _UNSAFE_FILENAME_RE.sub("_", text).strip(". ") or "_"
+
+
+def _read_json(path: Path, default):
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def write_json_if_changed(path: Path, obj) -> bool:
+    text = json.dumps(obj, ensure_ascii=False, indent=2) + "\n"
+    try:
+        if path.read_text(encoding="utf-8") == text:
+            return False
+    except FileNotFoundError:
+        pass
+    write_text_atomic(path, text)
+    return True
+
+
+@contextmanager
+def _index_lock(index_dir: Path):
+    index_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        import fcntl
+    except ImportError:  # 非 POSIX：不上鎖
+        yield
+        return
+    with (index_dir / ".lock").open("w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _upsert_manifest(path: Path, book_id: str, entry: dict | None) -> bool:
+    manifest = _read_json(path, {"books": []})
+    books = [b for b in manifest["books"] if b["id"] != book_id]
+    if entry is not None:
+        books.append(entry)
+    books.sort(key=lambda b: b["id"])
+    if not books:
+        if path.exists():
+            path.unlink()
+            return True
+        return False
+    return write_json_if_changed(path, {**manifest, "books": books})
+
+
+def update_site_index(index_path: Path, template: CompiledTemplate, title: str, story: list[str],
+                      meta: dict, files: dict[str, Path]) -> None:
+    index_dir = index_path.parent
+    today = dt.date.today().isoformat()
+    author = meta.get("author", "")
+    book = meta.get("book", "")
+    book_id = shard_name(f"{author}__{book}")
+    book_rel = f"books/{book_id}.json"
+
+    with _index_lock(index_dir):
+        book_path = index_dir / book_rel
+        previous = _read_json(book_path, None)
+        book_shard = {
+            "id": book_id,
+            "task": template.id,
+            "title": title,
+            "status": "generated",
+            "updated_at": today,
+            "content": "\n\n".join(story),
+            "paragraphs": story,
+            **meta,
+            # 網站用相對於 index.json 的路徑
+            "files": {fmt: os.path.relpath(path, index_dir) for fmt, path in files.items()},
+        }
+        # 重跑同一本、故事與檔案都沒變：沿用原本的 updated_at，書目分片與作者/日期清單都不動
+        unchanged = bool(previous and previous.get("updated_at")) and \
+            {**previous, "updated_at": today} == book_shard
+        if unchanged:
+            book_shard["updated_at"] = previous["updated_at"]
+        entry = {"id": book_id, "book": book, "author": author, "updated_at": book_shard["updated_at"],
+                 "path": book_rel}
+        root = _read_json(index_path, {})
+        if unchanged and root.get("layout") == SITE_INDEX_LAYOUT:
+            return
+        write_json_if_changed(book_path, book_shard)
+
+        if not unchanged:
+            _upsert_manifest(index_dir / "authors" / f"{shard_name(author)}.json", book_id, entry)
+            if previous and previous.get("updated_at") not in (None, today):
+                _upsert_manifest(index_dir / "dates" / f"{previous['updated_at']}.json", book_id, None)
+            _upsert_manifest(index_dir / "dates" / f"{today}.json", book_id, entry)
+
+        book_count = root.get("book_count", 0) if root.get("layout") == SITE_INDEX_LAYOUT else 0
+        root = {
+            "task": template.id or root.get("task"),
+            "title": title,
+            "status": "generated",
+            "updated_at": book_shard["updated_at"],
+            "content": book_shard["content"],
+            "layout": SITE_INDEX_LAYOUT,
+            "shards": {"books": "books/", "authors": "authors/", "dates": "dates/"},
+            "book_count": book_count + (0 if previous else 1),
+            "latest": entry,
+        }
+        write_json_if_changed(index_path, root)
+
+
+def write_outputs(template: CompiledTemplate | dict, title: str, story: list[str], docx_path: Path,
+                  outdir: Path, meta: dict) -> dict[str, Path]:
+    template = compile_template(template)
+    files = {}
+    for fmt in template.formats:
+        path = docx_path.with_suffix(_OUTPUT_SUFFIXES[fmt])
+        if fmt == "docx":
+            write_docx_fast(title, story, path)
+        else:
+            write_text_atomic(path, _TEXT_RENDERERS[fmt](title, story, meta))
+        files[fmt] = path
+
+    if template.site_index:
+        update_site_index(outdir / template.site_index, template, title, story, meta, files)
+    return files
+
+
+# -----------------------
+# 效能量測（--profile / TASK01_PROFILE）
+# - 每個階段記 wall time、CPU time、peak RSS；另記段落/token 數
+# - Linux 上每個階段開始前重設 VmHWM，peak RSS 才是「這個階段」的峰值
+# - 沒開的時候用 NULL_PROFILER，stage() 只回傳同一個 nullcontext
+# -----------------------
+def reset_peak_rss() -> bool:
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def proc_status_kb(field: str) -> int | None:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_kb() -> int | None:
+    peak = proc_status_kb("VmHWM")
+    if peak is not None:
+        return peak
+    # 沒有 /proc 的平台：ru_maxrss 是整個 process 到目前為止的峰值；Windows 沒有 resource，回傳 None
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+class StageProfiler:
+    enabled = True
+
+    def __init__(self):
+        self.stages: dict[str, dict] = {}
+        self.counts: dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        reset_peak_rss()
+        wall0 = time.perf_counter()
+        cpu0 = time.process_time()
+        try:
+            yield
+        finally:
+            self.stages[name] = {
+                "wall_s": round(time.perf_counter() - wall0, 6),
+                "cpu_s": round(time.process_time() - cpu0, 6),
+                "peak_rss_kb": peak_rss_kb(),
+            }
+
+    def count(self, **counts: int) -> None:
+        self.counts.update(counts)
+
+    def to_dict(self) -> dict:
+        return {"stages": self.stages, "counts": self.counts}
+
+
+class _NullProfiler:
+    enabled = False
+    _ctx = nullcontext()
+
+    def stage(self, name: str):
+        return self._ctx
+
+    def count(self, **counts: int) -> None:
+        pass
+
+    def to_dict(self) -> dict:
+        return {}
+
+
+NULL_PROFILER = _NullProfiler()
+
+
+def profile_log_path(profile: str | None, outdir: Path) -> Path | None:
+    # None = 關閉；"" / "1" = 寫到 outdir/task01_profile.jsonl；其他字串當路徑
+    if profile is None or profile.lower() in ("0", "false", "no"):
+        return None
+    if profile in ("", "1", "true", "yes"):
+        return outdir / "task01_profile.jsonl"
+    return Path(profile)
+
+
+def append_profile_line(log_path: Path, record: dict) -> None:
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with log_path.open("a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+# -----------------------
+# 單一來源處理（單檔與批次共用同一條流程）
+# -----------------------
+def build_output_path(template: CompiledTemplate | dict, book: str, author: str, outdir: Path) -> Path:
+    today = dt.datetime.now().strftime("%Y%m%d")
+    filename = compile_template(template).filename_pattern.format(
+        book=book, author=author, date=today
+    )
+    return outdir / filename
+
+
+def build_story(template: CompiledTemplate, source_path: Path, author: str, book: str,
+                notes_cache: Path | None = None,
+                notes_cache_max_bytes: int = DEFAULT_NOTES_CACHE_MAX_BYTES,
+                term_workers: int = 1, profiler=NULL_PROFILER,
+                corpus_index: Path | None = None, update_corpus: bool = True) -> tuple[dict, list[str]]:
+    with profiler.stage("extract_notes"):
+        notes = get_internal_notes(source_path, notes_cache, notes_cache_max_bytes, term_workers,
+                                   corpus_dir=corpus_index)
+    if corpus_index is not None:
+        with profiler.stage("corpus_tfidf"):
+            notes = rank_terms_tfidf(notes, corpus_index, corpus_doc_key(author, book), update=update_corpus)
+    profiler.count(
+        paragraphs=notes.get("all_count"),
+        prose_paragraphs=notes.get("prose_count"),
+        raw_tokens=notes.get("raw_token_count"),
+        candidates=notes.get("candidate_count"),
+    )
+
+    with profiler.stage("generate_task01_story"):
+        story = generate_task01_story(template, notes)
+    return notes, story
+
+
+def process_source(template: CompiledTemplate, source_path: Path, author: str, book: str, outdir: Path,
+                   notes_cache: Path | None = None,
+                   notes_cache_max_bytes: int = DEFAULT_NOTES_CACHE_MAX_BYTES,
+                   term_workers: int = 1, profiler=NULL_PROFILER,
+                   corpus_index: Path | None = None) -> tuple[Path, dict]:
+    notes, story = build_story(template, source_path, author, book, notes_cache, notes_cache_max_bytes,
+                               term_workers, profiler, corpus_index)
+    with profiler.stage("validate_story"):
+        validate_story_fast(template, notes, story)
+
+    out_path = build_output_path(template, book, author, outdir)
+    title = template.title
+    meta = {"book": book, "author": author, "observed_terms": notes.get("observed_terms", [])}
+    with profiler.stage("write_outputs"):
+        write_outputs(template, title, story, out_path, outdir, meta)
+    return out_path, notes
+
+
+# -----------------------
+# dry-run（--dry-run）
+# - 只跑抽取 → 生成 → 檢核，不寫 docx / 其他輸出，也不更新站內索引與跨書詞頻索引
+# - 檢核沒過不丟例外，記在 validation 裡，QA 才看得到是哪一條規則
+# - 每本書一筆 JSON，由 main 以 NDJSON 寫到 stdout
+# -----------------------
+def dry_run_source(template: CompiledTemplate, source_path: Path, author: str, book: str,
+                   notes_cache: Path | None = None,
+                   notes_cache_max_bytes: int = DEFAULT_NOTES_CACHE_MAX_BYTES,
+                   term_workers: int = 1, profiler=NULL_PROFILER,
+                   corpus_index: Path | None = None) -> dict:
+    notes, story = build_story(template, source_path, author, book, notes_cache, notes_cache_max_bytes,
+                               term_workers, profiler, corpus_index, update_corpus=False)
+    with profiler.stage("validate_story"):
+        try:
+            validate_story_fast(template, notes, story)
+            validation = {"ok": True, "error": None}
+        except ValueError as e:
+            validation = {"ok": False, "error": str(e)}
+    return {
+        "author": author,
+        "book": book,
+        "title": template.title,
+        # term_counts 是整本書的候選詞計數，太大，不放進輸出
+        "notes": {k: v for k, v in notes.items() if k != "term_counts"},
+        "picked_terms": pick_terms_for_story(template, notes),
+        "story": story,
+        "validation": validation,
+    }
+
+
+# -----------------------
+# 批次模式
+# - 模板只載入一次，透過 initializer 交給每個 worker
+# - 每個來源各自成功/失敗，不會因一本書壞掉就中斷整批
+# -----------------------
+_WORKER_TEMPLATE: CompiledTemplate | None = None
+
+
+def _init_worker(template: CompiledTemplate) -> None:
+    global _WORKER_TEMPLATE
+    _WORKER_TEMPLATE = template
+
+
+def _run_job(job: dict) -> dict:
+    source = Path(job["source"])
+    profiler = StageProfiler() if job.get("profile") else NULL_PROFILER
+    options = {
+        "notes_cache": Path(job["notes_cache"]) if job.get("notes_cache") else None,
+        "notes_cache_max_bytes": job.get("notes_cache_max_bytes", DEFAULT_NOTES_CACHE_MAX_BYTES),
+        "term_workers": job.get("term_workers", 1),
+        "profiler": profiler,
+        "corpus_index": Path(job["corpus_index"]) if job.get("corpus_index") else None,
+    }
+    try:
+        if job.get("dry_run"):
+            record = dry_run_source(_WORKER_TEMPLATE, source, job["author"], job["book"], **options)
+            return {"source": str(source), "ok": record["validation"]["ok"], "record": record,
+                    "profile": profiler.to_dict()}
+        out_path, notes = process_source(
+            _WORKER_TEMPLATE, source, job["author"], job["book"], Path(job["outdir"]), **options
+        )
+    except Exception as e:  # 單檔失敗要回報，不能拖垮整批
+        return {"source": str(source), "ok": False, "error": f"{type(e).__name__}: {e}",
+                "profile": profiler.to_dict()}
+    return {
+        "source": str(source),
+        "ok": True,
+        "output": str(out_path),
+        "all_count": notes.get("all_count"),
+        "prose_count": notes.get("prose_count"),
+        "observed_terms": notes.get("observed_terms"),
+        "profile": profiler.to_dict(),
+    }
+
+
+def _job_options(args) -> dict:
+    return {
+        "notes_cache": args.notes_cache,
+        "notes_cache_max_bytes": int(args.notes_cache_max_mb * 1024 * 1024),
+        "profile": profile_log_path(args.profile, Path(args.outdir)) is not None,
+        "corpus_index": getattr(args, "corpus_index", None),
+        "dry_run": getattr(args, "dry_run", False),
+    }
+
+
+def collect_jobs(args) -> list[dict]:
+    if args.manifest:
+        # manifest：JSON 陣列，每筆 {"source": ..., "author": ..., "book": ...}
+        # 相對路徑以 manifest 所在目錄為準；author/book 可省略，改用命令列預設值
+        manifest_path = Path(args.manifest)
+        with manifest_path.open("r", encoding="utf-8") as f:
+            entries = json.load(f)
+        jobs = []
+        for entry in entries:
+            source = Path(entry["source"])
+            if not source.is_absolute():
+                source = manifest_path.parent / source
+            jobs.append({
+                "source": str(source),
+                "author": entry.get("author", args.author or ""),
+                "book": entry.get("book", source.stem),
+                "outdir": args.outdir,
+                **_job_options(args),
+            })
+        return jobs
+
+    # sources-dir：資料夾內所有 .docx，書名預設用檔名
+    sources = sorted(
+        p for p in Path(args.sources_dir).iterdir()
+        if p.suffix.lower() == ".docx" and not p.name.startswith("~$")  # 跳過 Word 暫存檔
+    )
+    return [
+        {"source": str(p), "author": args.author or "", "book": p.stem, "outdir": args.outdir,
+         **_job_options(args)}
+        for p in sources
+    ]
+
+
+def iter_batch(template: CompiledTemplate, jobs: list[dict], workers: int) -> Iterator[dict]:
+    # 依 jobs 順序逐筆產出結果，前面的做完就能先輸出（dry-run 串流用）
+    if workers <= 1 or len(jobs) <= 1:
+        _init_worker(template)
+        yield from map(_run_job, jobs)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(template,))
+    try:
+        # chunksize 讓大量小檔不會每筆都來回一次 IPC
+        chunksize = max(1, len(jobs) // (workers * 4))
+        yield from pool.map(_run_job, jobs, chunksize=chunksize)
+    finally:
+        # 消費端提早停下（例如 dry-run 的輸出被 | head 關掉）時，還沒開始的工作直接取消
+        pool.shutdown(cancel_futures=True)
+
+
+def run_batch(template: CompiledTemplate, jobs: list[dict], workers: int) -> list[dict]:
+    return list(iter_batch(template, jobs, workers))
+
+
+def run_dry_run(template: CompiledTemplate, jobs: list[dict], workers: int, out=None) -> list[dict]:
+    # 每本書一行 JSON：{"source", "ok", ...record} 或 {"source", "ok": false, "error"}
+    out = out or sys.stdout
+    results = []
+    for r in iter_batch(template, jobs, workers):
+        line = {"source": r["source"], "ok": r["ok"], **r.get("record", {"error": r.get("error")})}
+        out.write(json.dumps(line, ensure_ascii=False) + "\n")
+        out.flush()
+        results.append(r)
+    return results
+
+
 # -----------------------
 # 主程式
 # -----------------------
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--template", required=True)
-    ap.add_argument("--source", required=True)
-    ap.add_argument("--author", required=True)
-    ap.add_argument("--book", required=True)
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--source", help="單一 .docx 來源")
+    src.add_argument("--sources-dir", help="批次：處理資料夾內所有 .docx")
+    src.add_argument("--manifest", help="批次：JSON 清單 [{source, author, book}, ...]")
+    ap.add_argument("--author", help="作者（單檔必填；批次為預設值）")
+    ap.add_argument("--book", help="書名（單檔必填；批次預設用檔名）")
     ap.add_argument("--outdir", default="outputs")
+    ap.add_argument("--notes-cache", default=os.environ.get("TASK01_NOTES_CACHE"),
+                    help="notes 快取資料夾（未指定則不快取；也可用環境變數 TASK01_NOTES_CACHE）")
+    ap.add_argument("--notes-cache-max-mb", type=float, default=DEFAULT_NOTES_CACHE_MAX_BYTES / 1024 / 1024,
+                    help="notes 快取容量上限（MB），超過會刪最久沒用的")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                    help="批次模式的 process 數（預設為 CPU 核心數）")
+    ap.add_argument("--profile", nargs="?", const="", default=os.environ.get("TASK01_PROFILE"),
+                    help="記錄各階段耗時/記憶體，寫成 JSON line（預設 outdir/task01_profile.jsonl；"
+                         "也可用環境變數 TASK01_PROFILE=1 或路徑）")
+    ap.add_argument("--term-workers", type=int, default=1,
+                    help="單檔模式：抽詞計數分給幾個 process（大型全系列書用；有快取時走增量抽取不使用）")
+    ap.add_argument("--corpus-index", default=os.environ.get("TASK01_CORPUS_INDEX"),
+                    help="跨書詞頻索引資料夾：處理時順便更新，observed_terms 改依 TF-IDF 排序"
+                         "（也可用環境變數 TASK01_CORPUS_INDEX）")
+    ap.add_argument("--dry-run", action="store_true",
+                    help="只抽取、生成、檢核，不寫任何輸出檔；每本書一行 JSON（NDJSON）印到 stdout")
     args = ap.parse_args()
 
-    template = load_template(Path(args.template))
-    paras = read_docx_paragraphs(Path(args.source))
-    notes = extract_internal_notes(paras)
+    if args.source and (not args.author or not args.book):
+        ap.error("--source 模式需要同時提供 --author 與 --book")
 
-    story = generate_task01_story(template, notes)
-    validate_story(template, notes, story)
+    profile_log = profile_log_path(args.profile, Path(args.outdir))
+    profiler = StageProfiler() if profile_log else NULL_PROFILER
 
-    today = dt.datetime.now().strftime("%Y%m%d")
-    filename = template["output"]["filename_pattern"].format(
-        book=args.book, author=args.author, date=today
-    )
-    out_path = Path(args.outdir) / filename
+    with profiler.stage("load_template"):
+        template = load_template(Path(args.template))
+
+    if args.dry_run:
+        # 單檔也當成一筆 job，輸出格式與批次一致；其餘訊息一律走 stderr，stdout 只有 NDJSON
+        if args.source:
+            jobs = [{"source": args.source, "author": args.author, "book": args.book, "outdir": args.outdir,
+                     "term_workers": args.term_workers, **_job_options(args)}]
+        else:
+            jobs = collect_jobs(args)
+            if not jobs:
+                print("沒有找到任何 .docx 來源", file=sys.stderr)
+                sys.exit(1)
+        try:
+            with profiler.stage("run_batch"):
+                results = run_dry_run(template, jobs, args.workers)
+        except BrokenPipeError:
+            # 下游（例如 | head）提早關掉 stdout：安靜結束；stdout 改指到 devnull，
+            # 免得直譯器結束時 flush 又丟一次 BrokenPipeError
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
+        failed = [r for r in results if not r["ok"]]
+        if profile_log:
+            ts = dt.datetime.now().isoformat(timespec="seconds")
+            for r in results:
+                append_profile_line(profile_log, {
+                    "kind": "source", "ts": ts, "source": r["source"], "output": None,
+                    "ok": r["ok"], "dry_run": True, **r["profile"],
+                })
+        print(f"Dry run done: {len(results) - len(failed)} ok, {len(failed)} failed", file=sys.stderr)
+        if failed:
+            sys.exit(1)
+        return
+
+    if args.source:
+        out_path, notes = process_source(
+            template, Path(args.source), args.author, args.book, Path(args.outdir),
+            notes_cache=Path(args.notes_cache) if args.notes_cache else None,
+            notes_cache_max_bytes=_job_options(args)["notes_cache_max_bytes"],
+            term_workers=args.term_workers,
+            profiler=profiler,
+            corpus_index=Path(args.corpus_index) if args.corpus_index else None,
+        )
+        if profile_log:
+            append_profile_line(profile_log, {
+                "kind": "source",
+                "ts": dt.datetime.now().isoformat(timespec="seconds"),
+                "source": args.source,
+                "output": str(out_path),
+                "ok": True,
+                **profiler.to_dict(),
+            })
+        print("Source paragraphs:", notes.get("all_count"))
+        print("Prose paragraphs:", notes.get("prose_count"))
+        print("Observed terms:", notes.get("observed_terms"))
+        print(f"OK: {out_path}")
+        return
+
+    jobs = collect_jobs(args)
+    if not jobs:
+        print("沒有找到任何 .docx 來源", file=sys.stderr)
+        sys.exit(1)
+
+    with profiler.stage("run_batch"):
+        results = run_batch(template, jobs, args.workers)
+    failed = [r for r in results if not r["ok"]]
 
-    title = template.get("name", "任務一｜主題白話理解")
-    write_docx(title, story, out_path)
+    if profile_log:
+        ts = dt.datetime.now().isoformat(timespec="seconds")
+        for r in results:
+            append_profile_line(profile_log, {
+                "kind": "source", "ts": ts, "source": r["source"], "output": r.get("output"),
+                "ok": r["ok"], **r["profile"],
+            })
+        append_profile_line(profile_log, {
+            "kind": "batch", "ts": ts, "workers": args.workers,
+            "ok": len(results) - len(failed), "failed": len(failed),
+            **profiler.to_dict(),
+        })
+    for r in results:
+        if r["ok"]:
+            print(f"OK: {r['source']} -> {r['output']} "
+                  f"(paragraphs={r['all_count']}, prose={r['prose_count']})")
+        else:
+            print(f"FAIL: {r['source']}: {r['error']}", file=sys.stderr)
+    print(f"Batch done: {len(results) - len(failed)} ok, {len(failed)} failed")
 
-    print("Source paragraphs:", notes.get("all_count"))
-    print("Prose paragraphs:", notes.get("prose_count"))
-    print("Observed terms:", notes.get("observed_terms"))
-    print(f"OK: {out_path}")
+    if failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
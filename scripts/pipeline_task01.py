@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import generate_task01 as g  # noqa: E402
+
+
+# -----------------------
+# asyncio 批次 pipeline
+# - 讀檔（磁碟 + zip inflate）、寫檔（docx 與其他輸出格式）丟 thread pool：I/O 為主
+# - 抽取 + 生成 + 檢核丟 process pool：CPU 為主
+# - 三段用 queue 串起來：讀下一本、算這一本、存上一本同時進行
+# - 讀取前先拿一個 read slot，處理完才還：讀取中、排隊中、處理中的書加起來最多 read_queue 本，
+#   這就是段落的記憶體上限（不會因為 io_workers / workers 多開而多握幾本）
+# -----------------------
+_DONE = object()
+
+
+def _read_stage(source: str) -> list[str]:
+    return list(g.iter_docx_paragraphs(Path(source)))
+
+
+def _process_stage(template: g.CompiledTemplate, paragraphs: list[str]) -> tuple[dict, list[str]]:
+    notes = g.extract_internal_notes(paragraphs)
+    story = g.generate_task01_story(template, notes)
+    g.validate_story_fast(template, notes, story)
+    return notes, story
+
+
+def _failure(job: dict, e: Exception) -> dict:
+    return {"source": job["source"], "ok": False, "error": f"{type(e).__name__}: {e}"}
+
+
+async def run_pipeline(template: g.CompiledTemplate, jobs: list[dict], *, read_queue: int = 4, write_queue: int = 4,
+                       workers: int = 1, io_workers: int = 4) -> list[dict]:
+    loop = asyncio.get_running_loop()
+    results: list[dict | None] = [None] * len(jobs)
+    title = template.title
+    read_slots = asyncio.Semaphore(read_queue)
+    read_q: asyncio.Queue = asyncio.Queue()  # 長度由 read_slots 限制
+    write_q: asyncio.Queue = asyncio.Queue(maxsize=write_queue)
+
+    with ThreadPoolExecutor(max_workers=io_workers) as io_pool, \
+            ProcessPoolExecutor(max_workers=workers) as cpu_pool:
+
+        async def reader():
+            # io_workers 個讀取者共用同一個 job iterator；read slot 用完就停下來等
+            pending_jobs = iter(enumerate(jobs))
+
+            async def read_worker():
+                for i, job in pending_jobs:
+                    await read_slots.acquire()
+                    try:
+                        paragraphs = await loop.run_in_executor(io_pool, _read_stage, job["source"])
+                    except Exception as e:
+                        paragraphs = e
+                    await read_q.put((i, paragraphs))
+
+            await asyncio.gather(*(read_worker() for _ in range(io_workers)))
+            await read_q.put(_DONE)
+
+        async def processor():
+            async def process_worker():
+                while (item := await read_q.get()) is not _DONE:
+                    i, paragraphs = item
+                    del item
+                    job = jobs[i]
+                    try:
+                        if isinstance(paragraphs, Exception):
+                            results[i] = _failure(job, paragraphs)
+                            continue
+                        try:
+                            notes, story = await loop.run_in_executor(cpu_pool, _process_stage, template,
+                                                                      paragraphs)
+                        except Exception as e:
+                            results[i] = _failure(job, e)
+                            continue
+                    finally:
+                        del paragraphs  # 段落放掉才把 slot 還給讀取者
+                        read_slots.release()
+                    out_path = g.build_output_path(template, job["book"], job["author"], Path(job["outdir"]))
+                    await write_q.put((i, notes, story, out_path))
+                await read_q.put(_DONE)  # 讓其他 process_worker 也看到結束
+
+            await asyncio.gather(*(process_worker() for _ in range(workers)))
+            await write_q.put(_DONE)
+
+        async def writer():
+            while (item := await write_q.get()) is not _DONE:
+                i, notes, story, out_path = item
+                job = jobs[i]
+                try:
+                    meta = {"book": job["book"], "author": job["author"],
+                            "observed_terms": notes.get("observed_terms", [])}
+                    await loop.run_in_executor(
+                        io_pool, g.write_outputs, template, title, story, out_path, Path(job["outdir"]), meta
+                    )
+                except Exception as e:
+                    results[i] = _failure(job, e)
+                    continue
+                results[i] = {
+                    "source": job["source"],
+                    "ok": True,
+                    "output": str(out_path),
+                    "all_count": notes.get("all_count"),
+                    "prose_count": notes.get("prose_count"),
+                    "observed_terms": notes.get("observed_terms"),
+                }
+
+        await asyncio.gather(reader(), processor(), writer())
+    return results
+
+
+def run_serial(template: g.CompiledTemplate, jobs: list[dict]) -> list[dict]:
+    # 與 generate_task01 --workers 1 相同的逐本處理，拿來當比較基準
+    g._init_worker(template)
+    return [g._run_job(job) for job in jobs]
+
+
+# -----------------------
+# 主程式
+# -----------------------
+def main():
+    ap = argparse.ArgumentParser(description="Task01 asyncio 批次 pipeline")
+    ap.add_argument("--template", required=True)
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--sources-dir", help="處理資料夾內所有 .docx")
+    src.add_argument("--manifest", help="JSON 清單 [{source, author, book}, ...]")
+    ap.add_argument("--author", help="作者預設值")
+    ap.add_argument("--outdir", default="outputs")
+    ap.add_argument("--read-queue", type=int, default=4,
+                    help="同時握在記憶體裡的書最多幾本（讀取中 + 排隊中 + 處理中）")
+    ap.add_argument("--write-queue", type=int, default=4, help="處理好但還沒存檔的書最多幾本")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="抽取/生成用的 process 數")
+    ap.add_argument("--io-workers", type=int, default=4, help="讀寫檔用的 thread 數")
+    ap.add_argument("--compare-serial", action="store_true", help="先跑一次逐本處理，印出兩者的吞吐量")
+    # collect_jobs 需要的欄位；pipeline 自己讀段落，不走 notes 快取
+    ap.set_defaults(notes_cache=None, notes_cache_max_mb=0, profile=None)
+    args = ap.parse_args()
+
+    template = g.load_template(Path(args.template))
+    jobs = g.collect_jobs(args)
+    if not jobs:
+        print("沒有找到任何 .docx 來源", file=sys.stderr)
+        sys.exit(1)
+
+    if args.compare_serial:
+        t0 = time.perf_counter()
+        run_serial(template, jobs)
+        serial_s = time.perf_counter() - t0
+        print(f"Serial: {len(jobs)} sources in {serial_s:.3f}s ({len(jobs) / serial_s:.2f} sources/s)")
+
+    t0 = time.perf_counter()
+    results = asyncio.run(run_pipeline(
+        template, jobs,
+        read_queue=args.read_queue, write_queue=args.write_queue,
+        workers=args.workers, io_workers=args.io_workers,
+    ))
+    pipeline_s = time.perf_counter() - t0
+
+    failed = [r for r in results if not r["ok"]]
+    for r in results:
+        if r["ok"]:
+            print(f"OK: {r['source']} -> {r['output']} "
+                  f"(paragraphs={r['all_count']}, prose={r['prose_count']})")
+        else:
+            print(f"FAIL: {r['source']}: {r['error']}", file=sys.stderr)
+    print(f"Pipeline: {len(jobs)} sources in {pipeline_s:.3f}s ({len(jobs) / pipeline_s:.2f} sources/s)")
+    if args.compare_serial:
+        print(f"Speedup vs serial: {serial_s / pipeline_s:.2f}x")
+    print(f"Batch done: {len(results) - len(failed)} ok, {len(failed)} failed")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, quote, urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import generate_task01 as g  # noqa: E402
+
+
+# -----------------------
+# 模板常駐（templates/*.yml）
+# - 啟動時全部載入，之後每次請求最多每秒 stat 一次，有改動就重載
+# - 模板名稱 = 檔名去掉 .yml，例如 task01_v1_1
+# -----------------------
+class TemplateStore:
+    def __init__(self, templates_dir: Path, check_interval: float = 1.0):
+        self.templates_dir = templates_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._templates: dict[str, g.CompiledTemplate] = {}
+        self._stamps: dict[str, tuple[int, int]] = {}
+        self._last_check = 0.0
+        self.refresh(force=True)
+
+    def refresh(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            self._last_check = now
+            seen = set()
+            for path in sorted(self.templates_dir.glob("*.yml")):
+                name = path.stem
+                seen.add(name)
+                try:
+                    st = path.stat()
+                except FileNotFoundError:  # 剛好被刪掉 / 編輯器換檔中
+                    continue
+                stamp = (st.st_mtime_ns, st.st_size)
+                if self._stamps.get(name) == stamp:
+                    continue
+                # 同一個 stamp 只試一次：壞掉的檔案不會每秒重試、重複記錄
+                self._stamps[name] = stamp
+                try:
+                    self._templates[name] = g.load_template(path)
+                except Exception as e:  # YAML 語法錯誤、存到一半、schema 不符…
+                    # 沿用上一份能用的模板，不讓錯誤冒到 get() / names() 的呼叫端
+                    kept = "，沿用上一版" if name in self._templates else ""
+                    print(f"模板載入失敗：{path}：{type(e).__name__}: {e}{kept}", file=sys.stderr)
+            for name in set(self._stamps) - seen:
+                self._templates.pop(name, None)
+                del self._stamps[name]
+
+    def get(self, name: str) -> g.CompiledTemplate:
+        self.refresh()
+        try:
+            return self._templates[name]
+        except KeyError:
+            raise LookupError(f"找不到模板：{name}") from None
+
+    def names(self) -> list[str]:
+        self.refresh()
+        return sorted(self._templates)
+
+
+# -----------------------
+# worker（在 process pool 裡跑）
+# -----------------------
+def _generate(template: g.CompiledTemplate, source: str, author: str, book: str, fmt: str,
+              notes_cache: str | None, source_id: str | None) -> dict:
+    notes = g.get_internal_notes(
+        Path(source), Path(notes_cache) if notes_cache else None, source_id=source_id
+    )
+    story = g.generate_task01_story(template, notes)
+    g.validate_story_fast(template, notes, story)
+
+    title = template.title
+    filename = g.build_output_path(template, book, author, Path(".")).name
+    # term_counts 是整本書的候選詞計數，太大，不放進回應（同 dry_run_source）
+    notes = {k: v for k, v in notes.items() if k != "term_counts"}
+    result = {"title": title, "filename": filename, "story": story, "notes": notes}
+    if fmt == "docx":
+        with tempfile.TemporaryDirectory() as tmp:
+            out_path = Path(tmp) / "out.docx"
+            g.write_docx_fast(title, story, out_path)
+            result["docx"] = out_path.read_bytes()
+    return result
+
+
+# -----------------------
+# HTTP API
+# - GET  /health                         → {"ok": true, "templates": [...]}
+# - POST /generate  (application/json)   → {"source": 路徑, "author", "book", "template", "format"}
+# - POST /generate?author=..&book=..     → body 直接放 .docx 上傳
+# - format=json（預設）回傳故事 JSON；format=docx 回傳檔案
+# -----------------------
+class Task01Handler(BaseHTTPRequestHandler):
+    server_version = "Task01Server/1.0"
+
+    def address_string(self) -> str:
+        # Unix socket 沒有 (host, port)
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str) -> None:
+        self._send_json(status, {"ok": False, "error": message})
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/health":
+            return self._send_error(HTTPStatus.NOT_FOUND, "not found")
+        self._send_json(HTTPStatus.OK, {"ok": True, "templates": self.server.templates.names()})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/generate":
+            return self._send_error(HTTPStatus.NOT_FOUND, "not found")
+
+        # 超過上限就直接拒絕，不讓請求在 pool 前面越排越長
+        if not self.server.slots.acquire(blocking=False):
+            return self._send_error(HTTPStatus.SERVICE_UNAVAILABLE, "伺服器忙碌中，請稍後再試")
+        try:
+            self._handle_generate(url)
+        finally:
+            self.server.slots.release()
+
+    def _handle_generate(self, url) -> None:
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:  # rfile.read(-1) 會一直等到 client 關閉連線
+            return self._send_error(HTTPStatus.BAD_REQUEST, "Content-Length 不正確")
+        if length > self.server.max_upload_bytes:
+            return self._send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "上傳檔案太大")
+        body = self.rfile.read(length) if length else b""
+
+        upload = None
+        if self.headers.get_content_type() == "application/json":
+            try:
+                decoded = json.loads(body or b"{}")
+            except ValueError:
+                return self._send_error(HTTPStatus.BAD_REQUEST, "JSON 格式錯誤")
+            if not isinstance(decoded, dict):
+                return self._send_error(HTTPStatus.BAD_REQUEST, "JSON 最外層必須是 object")
+            params.update(decoded)
+        elif body:
+            upload = body
+
+        for key in ("author", "book", "source", "template", "format"):
+            if key in params and not isinstance(params[key], str):
+                return self._send_error(HTTPStatus.BAD_REQUEST, f"{key} 必須是字串")
+
+        author = params.get("author")
+        book = params.get("book")
+        fmt = params.get("format", "json")
+        if not author or not book:
+            return self._send_error(HTTPStatus.BAD_REQUEST, "需要 author 與 book")
+        if fmt not in ("json", "docx"):
+            return self._send_error(HTTPStatus.BAD_REQUEST, f"不支援的 format：{fmt}")
+
+        try:
+            template = self.server.templates.get(params.get("template", self.server.default_template))
+        except LookupError as e:
+            return self._send_error(HTTPStatus.NOT_FOUND, str(e))
+
+        tmp_path = None
+        try:
+            if upload is not None:
+                with tempfile.NamedTemporaryFile(suffix=".docx", delete=False) as f:
+                    f.write(upload)
+                    tmp_path = f.name
+                source, source_id = tmp_path, f"upload:{author}:{book}"
+            else:
+                if not params.get("source"):
+                    return self._send_error(HTTPStatus.BAD_REQUEST, "需要 source 路徑或上傳 .docx")
+                resolved = (self.server.source_root / params["source"]).resolve()
+                if not resolved.is_relative_to(self.server.source_root):
+                    return self._send_error(HTTPStatus.FORBIDDEN, "source 不在允許的資料夾內")
+                source, source_id = str(resolved), None
+
+            future = self.server.pool.submit(
+                _generate, template, source, author, book, fmt, self.server.notes_cache, source_id
+            )
+            result = future.result()
+        except FileNotFoundError as e:
+            return self._send_error(HTTPStatus.NOT_FOUND, f"找不到來源：{e.filename}")
+        except zipfile.BadZipFile:
+            return self._send_error(HTTPStatus.UNPROCESSABLE_ENTITY, "來源不是有效的 .docx")
+        except ValueError as e:  # 格式不符 / 檢核沒過
+            return self._send_error(HTTPStatus.UNPROCESSABLE_ENTITY, str(e))
+        except Exception as e:
+            return self._send_error(HTTPStatus.INTERNAL_SERVER_ERROR, f"{type(e).__name__}: {e}")
+        finally:
+            if tmp_path:
+                os.unlink(tmp_path)
+
+        if fmt == "docx":
+            data = result["docx"]
+            self.send_response(HTTPStatus.OK)
+            self.send_header(
+                "Content-Type", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+            )
+            self.send_header("Content-Disposition", f"attachment; filename*=UTF-8''{quote(result['filename'])}")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        self._send_json(HTTPStatus.OK, {"ok": True, **result})
+
+
+class _Task01ServerMixin:
+    daemon_threads = True
+
+    def setup_task01(self, args, templates: TemplateStore, pool: ProcessPoolExecutor) -> None:
+        self.templates = templates
+        self.pool = pool
+        self.default_template = args.default_template
+        self.notes_cache = args.notes_cache
+        self.source_root = Path(args.source_root).resolve()
+        self.max_upload_bytes = int(args.max_upload_mb * 1024 * 1024)
+        self.slots = threading.BoundedSemaphore(args.workers + args.max_queue)
+
+
+class Task01HTTPServer(_Task01ServerMixin, ThreadingHTTPServer):
+    pass
+
+
+class Task01UnixServer(_Task01ServerMixin, socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    pass
+
+
+# -----------------------
+# 主程式
+# -----------------------
+def main():
+    root = Path(__file__).resolve().parent.parent
+    ap = argparse.ArgumentParser(description="Task01 常駐產生服務（HTTP / Unix socket）")
+    ap.add_argument("--templates-dir", default=str(root / "templates"))
+    ap.add_argument("--default-template", default="task01_v1_1")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--unix-socket", help="改聽 Unix socket（指定時忽略 --host/--port）")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="產生故事的 process 數")
+    ap.add_argument("--max-queue", type=int, default=16, help="worker 都忙時最多再排幾個請求，超過回 503")
+    ap.add_argument("--source-root", default=".", help="以路徑指定 source 時，只允許這個資料夾底下的檔案")
+    ap.add_argument("--max-upload-mb", type=float, default=200)
+    ap.add_argument("--notes-cache", default=os.environ.get("TASK01_NOTES_CACHE"),
+                    help="notes 快取資料夾（建議開啟，重複請求才會快）")
+    args = ap.parse_args()
+
+    templates = TemplateStore(Path(args.templates_dir))
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        # 先把 worker 叫起來，第一個請求才不用等 process 啟動
+        list(pool.map(int, range(args.workers)))
+
+        if args.unix_socket:
+            if os.path.exists(args.unix_socket):
+                os.unlink(args.unix_socket)
+            server = Task01UnixServer(args.unix_socket, Task01Handler)
+            where = f"unix:{args.unix_socket}"
+        else:
+            server = Task01HTTPServer((args.host, args.port), Task01Handler)
+            where = f"http://{args.host}:{server.server_address[1]}"
+        server.setup_task01(args, templates, pool)
+
+        print(f"Task01 server listening on {where} (templates: {', '.join(templates.names())})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if args.unix_socket and os.path.exists(args.unix_socket):
+                os.unlink(args.unix_socket)
+
+
+if __name__ == "__main__":
+    main()
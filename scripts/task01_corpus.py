@@ -0,0 +1,351 @@
+from __future__ import annotations
+
+import heapq
+import json
+import math
+import mmap
+import os
+import shutil
+import zlib
+from array import array
+from collections import Counter
+from collections.abc import Iterable
+from contextlib import contextmanager
+from pathlib import Path
+
+
+# -----------------------
+# 全書庫詞頻索引（document frequency → TF-IDF）
+# - 每本書處理完就把它的候選詞集合加進來，不用整批重建
+# - 詞彙以 append-only 方式給 id（id 一旦給出就不變），詞 → id 查雜湊表
+# - 陣列都是定長二進位檔，讀取端直接 mmap，不需要整份載入成 Python 物件
+#   多個 worker 開同一版時共用 page cache，詞彙再大每個 process 的 RSS 也不會跟著長
+# - 兩層：不可變的 base（gen-XXXXXX/）+ 只會往後接的 delta.log
+#   每次更新只在 delta.log 尾端接一行（新詞字串、這本書加減的 id），O(這本書的詞數)
+#   delta 長到 base 的一定比例才整份壓實成新的 gen，攤提下來每次更新不用重寫整個詞彙
+# - CURRENT = "gen-XXXXXX <delta.log 已提交的 bytes>"，寫完 delta 才原子性地改 CURRENT：
+#   讀取端只讀到已提交的長度，拿到的永遠是一整組一致的快照
+#
+# gen 目錄內容：
+#   strings.bin    所有詞的 UTF-8 bytes 依 id 接在一起
+#   offsets.u64    第 i 個詞是 strings[offsets[i]:offsets[i+1]]
+#   hash.u32       open addressing 雜湊表（crc32，線性探測），存 id + 1，0 為空格
+#   df.u32         每個 id 出現在幾本書
+#   doc_terms.u32  每本書算進去的 id（排序後）依書接在一起
+#   docs.json      {書: [doc_terms 起點, 個數]}（重跑同一本時先扣掉舊的）
+#   meta.json      {"version", "n_docs", "n_terms"}
+#   delta.log      壓實後的更新，一行一筆 {"doc", "new_doc", "terms", "add", "remove"}
+#                  terms 是這筆新給 id 的詞（id 依序接在目前詞彙之後）
+#
+# vocab_only=True（平行計數的 worker 用）：只 mmap strings / offsets / hash，delta 只取新詞；
+# 不讀 docs.json、不重播 df 與每本書的增減，每個 worker 的 RSS 不隨書本數與 delta 長度增加
+# -----------------------
+CORPUS_FORMAT_VERSION = 2
+# 壓實時保留的舊 generation 數：worker 依主程式拿到的 snapshot 再開同一版，不能太快刪掉
+_KEEP_GENERATIONS = 4
+_OPEN_RETRIES = 5
+# delta.log 超過 max(下限, base 大小 × 比例) 就壓實；讀取端每次開索引要重播的量因此有上限
+_COMPACT_MIN_BYTES = 1 << 20
+_COMPACT_RATIO = 0.25
+
+
+def _idf(n_docs: int, df: int) -> float:
+    return math.log((1 + n_docs) / (1 + df)) + 1.0
+
+
+def _map_array(path: Path, typecode: str):
+    # 回傳 (mmap, memoryview)；空檔案不能 mmap，回傳空 array
+    with path.open("rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return None, memoryview(array(typecode))
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return mm, memoryview(mm).cast("B").cast(typecode)
+
+
+class CorpusIndex:
+    """唯讀的索引快照：base 以 mmap 共用 page cache，delta 重播成小的 dict。"""
+
+    def __init__(self, root: Path, snapshot: tuple[str, int] | None = None, *, vocab_only: bool = False):
+        # snapshot 指定時固定讀那一版（例如主程式與 worker 要看到同一組 id）
+        # vocab_only 只能查詞 ↔ id（term / term_id / n_terms），df 與書本相關的查詢會丟 ValueError
+        self.root = Path(root)
+        self.vocab_only = vocab_only
+        for attempt in range(_OPEN_RETRIES):
+            try:
+                self._open(snapshot or _read_current(self.root))
+                return
+            except FileNotFoundError:
+                # 讀完 CURRENT、還沒打開之前，那一版剛好被別的 process 壓實後刪掉：重讀 CURRENT
+                self.close()
+                if snapshot is not None or attempt == _OPEN_RETRIES - 1:
+                    raise
+
+    def _open(self, snapshot: tuple[str, int] | None) -> None:
+        self._maps: list[mmap.mmap] = []
+        self._extra: list[str] = []  # delta 裡新增的詞，id = n_base + i
+        self._extra_ids: dict[str, int] = {}
+        self._df_added: Counter = Counter()  # delta 的 df 加減分開記，重播時都是 C 層的 Counter.update
+        self._df_removed: Counter = Counter()
+        self._doc_edits: dict[str, list[tuple[list[int], list[int]]]] = {}
+        self.snapshot = None
+        self.generation = None
+        self.n_docs = 0
+        self.n_base = 0
+        self.base_bytes = 0
+        self._docs: dict[str, list[int]] = {}
+        self._strings = memoryview(b"")
+        self._offsets = self._hash = self._df = self._doc_terms = memoryview(array("I"))
+        if snapshot is None:
+            return
+
+        self.snapshot = tuple(snapshot)
+        self.generation, delta_size = snapshot
+        gen = self.root / self.generation
+        meta = json.loads((gen / "meta.json").read_text(encoding="utf-8"))
+        if meta.get("version") != CORPUS_FORMAT_VERSION:
+            raise ValueError(f"詞頻索引版本不符：{meta.get('version')}")
+        self.n_docs = meta["n_docs"]
+        self.n_base = meta["n_terms"]
+        files = [("strings.bin", "B", "_strings"), ("offsets.u64", "Q", "_offsets"), ("hash.u32", "I", "_hash")]
+        if not self.vocab_only:
+            self._docs = json.loads((gen / "docs.json").read_text(encoding="utf-8"))
+            files += [("df.u32", "I", "_df"), ("doc_terms.u32", "I", "_doc_terms")]
+        for name, typecode, attr in files:
+            mm, view = _map_array(gen / name, typecode)
+            setattr(self, attr, view)
+            if mm is not None:
+                self._maps.append(mm)
+        self.base_bytes = len(self._strings) + len(self._doc_terms) * 4
+
+        if delta_size:
+            with (gen / "delta.log").open("rb") as f:
+                data = f.read(delta_size)
+            for line in data.splitlines():
+                record = json.loads(line)
+                if self.vocab_only:
+                    self._add_terms(record["terms"])
+                else:
+                    self.apply(record)
+
+    def close(self) -> None:
+        for view in (self._strings, self._offsets, self._hash, self._df, self._doc_terms):
+            view.release()
+        for m in self._maps:
+            m.close()
+        self._maps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def n_terms(self) -> int:
+        return self.n_base + len(self._extra)
+
+    def _add_terms(self, terms: list[str]) -> None:
+        start = self.n_terms
+        self._extra_ids.update(zip(terms, range(start, start + len(terms))))
+        self._extra.extend(terms)
+
+    def _require_full(self) -> None:
+        if self.vocab_only:
+            raise ValueError("vocab_only 開啟的索引沒有載入 df / 書本資料")
+
+    def apply(self, record: dict) -> None:
+        # 重播一筆 delta（開檔時逐行套用；寫入端壓實前也用它把這一筆加進來）
+        self._require_full()
+        self._add_terms(record["terms"])
+        if record["new_doc"]:
+            self.n_docs += 1
+        self._df_added.update(record["add"])
+        self._df_removed.update(record["remove"])
+        self._doc_edits.setdefault(record["doc"], []).append((record["add"], record["remove"]))
+
+    def term_bytes(self, term_id: int) -> bytes:
+        if term_id >= self.n_base:
+            return self._extra[term_id - self.n_base].encode("utf-8")
+        return bytes(self._strings[self._offsets[term_id]:self._offsets[term_id + 1]])
+
+    def term(self, term_id: int) -> str:
+        return self.term_bytes(term_id).decode("utf-8")
+
+    def term_id(self, term: str) -> int | None:
+        if len(self._hash):
+            key = term.encode("utf-8")
+            mask = len(self._hash) - 1
+            slot = zlib.crc32(key) & mask
+            while entry := self._hash[slot]:
+                if self.term_bytes(entry - 1) == key:
+                    return entry - 1
+                slot = (slot + 1) & mask
+        return self._extra_ids.get(term)
+
+    def df_by_id(self, term_id: int) -> int:
+        self._require_full()
+        base = self._df[term_id] if term_id < self.n_base else 0
+        return base + self._df_added[term_id] - self._df_removed[term_id]
+
+    def df(self, term: str) -> int:
+        tid = self.term_id(term)
+        return self.df_by_id(tid) if tid is not None else 0
+
+    def idf(self, term: str) -> float:
+        # 沒看過的詞：當作 df = 0
+        return _idf(self.n_docs, self.df(term))
+
+    def rank(self, term_counts: dict[str, int], top_k: int = 12) -> list[str]:
+        # tf × idf；每個候選詞查一次 df（雜湊表 O(1)），取前 k 名 O(C log k)
+        # 同分維持 term_counts 的順序（nlargest 是穩定的）
+        return heapq.nlargest(top_k, term_counts, key=lambda t: term_counts[t] * self.idf(t))
+
+    def doc_keys(self) -> list[str]:
+        self._require_full()
+        return list(self._docs) + [d for d in self._doc_edits if d not in self._docs]
+
+    def doc_terms(self, doc_key: str) -> set[int] | None:
+        # 這本書目前算進去的 id；沒收錄過回傳 None
+        self._require_full()
+        if doc_key not in self._docs and doc_key not in self._doc_edits:
+            return None
+        ids: set[int] = set()
+        if doc_key in self._docs:
+            start, count = self._docs[doc_key]
+            ids.update(self._doc_terms[start:start + count])
+        for add, remove in self._doc_edits.get(doc_key, ()):
+            ids.difference_update(remove)
+            ids.update(add)
+        return ids
+
+
+# -----------------------
+# 更新（在 delta.log 尾端接一行；太長時壓實成新 generation）
+# -----------------------
+def _read_current(root: Path) -> tuple[str, int] | None:
+    try:
+        fields = (root / "CURRENT").read_text(encoding="utf-8").split()
+    except FileNotFoundError:
+        return None
+    if not fields:
+        return None
+    return fields[0], int(fields[1]) if len(fields) > 1 else 0
+
+
+def _write_current(root: Path, generation: str, delta_size: int) -> None:
+    tmp = root / f".CURRENT.{os.getpid()}.tmp"
+    tmp.write_text(f"{generation} {delta_size}", encoding="utf-8")
+    os.replace(tmp, root / "CURRENT")
+
+
+@contextmanager
+def _corpus_lock(root: Path):
+    root.mkdir(parents=True, exist_ok=True)
+    try:
+        import fcntl
+    except ImportError:  # 非 POSIX：不上鎖
+        yield
+        return
+    with (root / ".lock").open("w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _build_hash_table(terms: list[bytes]) -> array:
+    size = 8
+    while size < 2 * len(terms):  # 負載 <= 0.5，探測長度維持常數
+        size *= 2
+    mask = size - 1
+    table = array("I", [0]) * size
+    for tid, key in enumerate(terms):
+        slot = zlib.crc32(key) & mask
+        while table[slot]:
+            slot = (slot + 1) & mask
+        table[slot] = tid + 1
+    return table
+
+
+def _compact(root: Path, index: CorpusIndex) -> None:
+    # base + delta 整份寫成新的 gen（delta 清空）；只有 delta 太長時才做
+    number = int(index.generation.split("-")[1]) + 1 if index.generation else 1
+    gen = root / f"gen-{number:06d}"
+    if gen.exists():
+        shutil.rmtree(gen)
+    gen.mkdir()
+
+    terms = [index.term_bytes(tid) for tid in range(index.n_terms)]
+    offsets = array("Q", [0])
+    for t in terms:
+        offsets.append(offsets[-1] + len(t))
+    df = array("I", (index.df_by_id(tid) for tid in range(index.n_terms)))
+    doc_terms = array("I")
+    docs = {}
+    for key in index.doc_keys():
+        ids = sorted(index.doc_terms(key))
+        docs[key] = [len(doc_terms), len(ids)]
+        doc_terms.extend(ids)
+
+    (gen / "strings.bin").write_bytes(b"".join(terms))
+    for name, arr in (("offsets.u64", offsets), ("hash.u32", _build_hash_table(terms)),
+                      ("df.u32", df), ("doc_terms.u32", doc_terms)):
+        with (gen / name).open("wb") as f:
+            arr.tofile(f)
+    (gen / "docs.json").write_text(json.dumps(docs, ensure_ascii=False), encoding="utf-8")
+    (gen / "meta.json").write_text(json.dumps({
+        "version": CORPUS_FORMAT_VERSION, "n_docs": index.n_docs, "n_terms": len(terms),
+    }), encoding="utf-8")
+    (gen / "delta.log").touch()
+
+    _write_current(root, gen.name, 0)
+
+    # 舊 generation 只留最近幾份；已經 mmap 的讀取端不受刪檔影響
+    gens = sorted(p for p in root.glob("gen-*") if p.is_dir())
+    for old in gens[:-_KEEP_GENERATIONS]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def update_corpus(root: Path, doc_key: str, terms: Iterable[str]) -> None:
+    root = Path(root)
+    with _corpus_lock(root), CorpusIndex(root) as index:
+        new_terms: list[str] = []
+        pending: dict[str, int] = {}
+        new_ids = set()
+        for term in terms:
+            tid = index.term_id(term)
+            if tid is None:
+                tid = pending.get(term)
+                if tid is None:
+                    tid = pending[term] = index.n_terms + len(new_terms)
+                    new_terms.append(term)
+            new_ids.add(tid)
+
+        old_ids = index.doc_terms(doc_key)
+        if old_ids == new_ids:
+            return  # 同一本書、詞集合沒變：不用寫
+        record = {
+            "doc": doc_key,
+            "new_doc": old_ids is None,
+            "terms": new_terms,
+            "add": sorted(new_ids - (old_ids or set())),
+            "remove": sorted((old_ids or set()) - new_ids),
+        }
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+        delta_size = index.snapshot[1] if index.snapshot else 0
+        limit = max(_COMPACT_MIN_BYTES, _COMPACT_RATIO * index.base_bytes)
+        if index.generation is None or delta_size + len(line) > limit:
+            index.apply(record)
+            _compact(root, index)
+            return
+
+        with (root / index.generation / "delta.log").open("r+b") as f:
+            f.truncate(delta_size)  # 上次寫到一半就中斷、還沒提交進 CURRENT 的尾巴丟掉
+            f.seek(delta_size)
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        _write_current(root, index.generation, delta_size + len(line))
@@ -0,0 +1,353 @@
+from __future__ import annotations
+
+import argparse
+import bisect
+import datetime as dt
+import heapq
+import json
+import mmap
+import os
+import sys
+from array import array
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import fetch_youtube as fy  # noqa: E402
+
+
+# -----------------------
+# 欄式影片歷史庫（data/youtube_store/）
+# - data/youtube.json 只留滾動視窗內的影片；這裡把每次看過的影片累積下來，跨年查詢用
+# - 一列 = (影片, 超商)；列依 (publishedAt, 影片 id, 超商) 排序存放：published 欄本身就是日期索引
+# - 欄位都是定長陣列檔，讀取時 mmap，不必把每筆重新 parse 成 dict：
+#     published.i64   發佈時間（epoch 秒）
+#     duration.u32    長度（秒）
+#     channel.u32     頻道 id（對到 meta.json 的 channels）
+#     store.u16       超商 id（對到 meta.json 的 stores）
+#     by_duration.u32 依長度排序的列號（長度索引）
+#     ids.bin / ids.off、titles.bin / titles.off   影片 id 與標題（UTF-8 接在一起 + 起點）
+# - 日期區間、長度區間各自 O(log n) 找到範圍，只掃比較窄的那一段：
+#   O(log n + 較窄那段的列數)；不是 O(log n + k)，另一個條件與超商只能在那一段裡逐筆檢查
+# -----------------------
+STORE_FORMAT_VERSION = 1
+_COLUMNS = {
+    "published": ("published.i64", "q"),
+    "duration": ("duration.u32", "I"),
+    "channel": ("channel.u32", "I"),
+    "store": ("store.u16", "H"),
+    "by_duration": ("by_duration.u32", "I"),
+    "ids_off": ("ids.off", "Q"),
+    "titles_off": ("titles.off", "Q"),
+}
+
+
+def parse_display_duration(text: str) -> int:
+    # "16:24" → 984、"1:02:03" → 3723
+    seconds = 0
+    for part in (text or "").split(":"):
+        if not part.isdigit():
+            return 0
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+
+def to_epoch(value: int | float | str | dt.datetime) -> int:
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = dt.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=dt.timezone.utc)
+    return int(value.timestamp())
+
+
+def _epoch_to_iso(ts: int) -> str:
+    return dt.datetime.fromtimestamp(ts, dt.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _map_column(path: Path, typecode: str):
+    with path.open("rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None, memoryview(array(typecode))
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return mm, memoryview(mm).cast("B").cast(typecode)
+
+
+# -----------------------
+# 讀取 / 查詢
+# -----------------------
+class VideoStore:
+    def __init__(self, store_dir: Path):
+        self.store_dir = Path(store_dir)
+        self._maps: list[mmap.mmap] = []
+        meta_path = self.store_dir / "meta.json"
+        if not meta_path.exists():
+            self.meta = {"version": STORE_FORMAT_VERSION, "rows": 0, "stores": [], "channels": []}
+            for name, (_, typecode) in _COLUMNS.items():
+                setattr(self, "_" + name, memoryview(array(typecode, [0] if name.endswith("_off") else [])))
+            self._ids = self._titles = memoryview(b"")
+            return
+
+        self.meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if self.meta.get("version") != STORE_FORMAT_VERSION:
+            raise ValueError(f"影片庫版本不符：{self.meta.get('version')}")
+        if self.meta.get("byteorder", sys.byteorder) != sys.byteorder:
+            raise ValueError("影片庫是在不同位元組順序的機器上建的，請重新 build")
+        for name, (filename, typecode) in _COLUMNS.items():
+            mm, view = _map_column(self.store_dir / filename, typecode)
+            setattr(self, "_" + name, view)
+            if mm is not None:
+                self._maps.append(mm)
+        for name in ("ids", "titles"):
+            mm, view = _map_column(self.store_dir / f"{name}.bin", "B")
+            setattr(self, "_" + name, view)
+            if mm is not None:
+                self._maps.append(mm)
+
+    def close(self) -> None:
+        for name in (*_COLUMNS, "ids", "titles"):
+            getattr(self, "_" + name).release()
+        for mm in self._maps:
+            mm.close()
+        self._maps = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._published)
+
+    @property
+    def stores(self) -> list[str]:
+        return self.meta["stores"]
+
+    @property
+    def channels(self) -> list[str]:
+        return self.meta["channels"]
+
+    def _string(self, blob: memoryview, offsets: memoryview, i: int) -> str:
+        return bytes(blob[offsets[i]:offsets[i + 1]]).decode("utf-8")
+
+    def video_id(self, row: int) -> str:
+        return self._string(self._ids, self._ids_off, row)
+
+    def row(self, row: int) -> dict:
+        # 與 data/youtube.json 相同的欄位，另外附上 store 與數值欄位
+        published = self._published[row]
+        duration = self._duration[row]
+        return {
+            "title": self._string(self._titles, self._titles_off, row),
+            "channel": self.channels[self._channel[row]],
+            "publishedAt": _epoch_to_iso(published),
+            "url": fy.video_url(self.video_id(row)),
+            "duration": fy.format_duration(duration),
+            "store": self.stores[self._store[row]],
+            "published": published,
+            "duration_seconds": duration,
+        }
+
+    # ---- 索引範圍（都是 O(log n)）----
+    def published_range(self, start=None, end=None) -> range:
+        # start <= publishedAt < end 的列號範圍
+        lo = bisect.bisect_left(self._published, to_epoch(start)) if start is not None else 0
+        hi = bisect.bisect_left(self._published, to_epoch(end)) if end is not None else len(self)
+        return range(lo, max(lo, hi))
+
+    def duration_range(self, min_seconds: int | None = None, max_seconds: int | None = None) -> range:
+        # by_duration 裡 min_seconds <= duration <= max_seconds 的位置範圍
+        key = self._duration.__getitem__
+        lo = bisect.bisect_left(self._by_duration, min_seconds, key=key) if min_seconds is not None else 0
+        hi = (bisect.bisect_right(self._by_duration, max_seconds, key=key)
+              if max_seconds is not None else len(self))
+        return range(lo, max(lo, hi))
+
+    def _store_id(self, store: str | None) -> int | None:
+        if store is None:
+            return None
+        try:
+            return self.stores.index(store)
+        except ValueError:
+            return -1  # 沒有這家：什麼都不會符合
+
+    def query(self, start=None, end=None, *, store: str | None = None, min_seconds: int | None = None,
+              max_seconds: int | None = None, limit: int | None = None, newest_first: bool = True) -> list[dict]:
+        store_id = self._store_id(store)
+        by_date = self.published_range(start, end)
+        has_duration = min_seconds is not None or max_seconds is not None
+        by_length = self.duration_range(min_seconds, max_seconds) if has_duration else None
+
+        if by_length is not None and len(by_length) < len(by_date):
+            # 長度範圍比較窄：從長度索引取列號，再檢查日期，最後依日期排序
+            rows = sorted(
+                (r for r in (self._by_duration[i] for i in by_length) if r in by_date),
+                reverse=newest_first,
+            )
+        else:
+            rows = reversed(by_date) if newest_first else iter(by_date)
+            if by_length is not None:
+                lo = min_seconds if min_seconds is not None else 0
+                hi = max_seconds if max_seconds is not None else 2 ** 32
+                rows = (r for r in rows if lo <= self._duration[r] <= hi)
+
+        out = []
+        for r in rows:
+            if store_id is not None and self._store[r] != store_id:
+                continue
+            out.append(self.row(r))
+            if limit is not None and len(out) >= limit:
+                break
+        return out
+
+    def latest(self, n: int, store: str | None = None, before=None) -> list[dict]:
+        return self.query(end=before, store=store, limit=n)
+
+    def longest(self, n: int, store: str | None = None, start=None, end=None) -> list[dict]:
+        # 兩種取法，結果相同（同長度時列號大的在前）：
+        # - 從長度索引尾端往回取、逐筆檢查日期：符合的列夠密時很快停下，但窄區間最壞要走完整個 O(n)
+        # - 日期範圍內用 heapq.nlargest 挑：O(m log k)，m = 日期範圍的列數
+        # 依條件獨立估計，往回走大約要看 k·n/m 列；m² <= k·n 時日期範圍比較便宜
+        store_id = self._store_id(store)
+        by_date = self.published_range(start, end)
+        if len(by_date) * len(by_date) <= n * len(self):
+            duration = self._duration
+            rows = (r for r in by_date if store_id is None or self._store[r] == store_id)
+            return [self.row(r) for r in heapq.nlargest(n, rows, key=lambda r: (duration[r], r))]
+        out = []
+        for i in reversed(range(len(self))):
+            r = self._by_duration[i]
+            if r not in by_date or (store_id is not None and self._store[r] != store_id):
+                continue
+            out.append(self.row(r))
+            if len(out) >= n:
+                break
+        return out
+
+
+# -----------------------
+# 建置 / 合併
+# - 讀出既有的列，併進這次 youtube.json 的影片（以 (影片 id, 超商) 去重，新的覆蓋舊的）
+# - 重新排序後整組重寫；內容沒變的欄位檔不重寫
+# -----------------------
+def _existing_rows(store_dir: Path) -> dict[tuple[str, str], tuple]:
+    rows = {}
+    with VideoStore(store_dir) as vs:
+        for r in range(len(vs)):
+            key = (vs.video_id(r), vs.stores[vs._store[r]])
+            rows[key] = (vs._published[r], vs._duration[r], vs.channels[vs._channel[r]],
+                         vs._string(vs._titles, vs._titles_off, r))
+    return rows
+
+
+def _write_if_changed(path: Path, data: bytes) -> bool:
+    try:
+        if path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        pass
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+    return True
+
+
+def _string_table(values: list[str]) -> tuple[bytes, array]:
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = array("Q", [0])
+    for b in encoded:
+        offsets.append(offsets[-1] + len(b))
+    return b"".join(encoded), offsets
+
+
+def update_video_store(store_dir: Path, data: dict[str, list[dict]]) -> int:
+    # 回傳實際改寫的檔案數
+    store_dir = Path(store_dir)
+    rows = _existing_rows(store_dir)
+    for store, videos in data.items():
+        for v in videos:
+            vid = fy.video_id_from_url(v.get("url", ""))
+            if not vid or not v.get("publishedAt"):
+                continue
+            rows[(vid, store)] = (to_epoch(v["publishedAt"]), parse_display_duration(v.get("duration", "")),
+                                  v.get("channel", ""), v.get("title", ""))
+
+    order = sorted(rows, key=lambda k: (rows[k][0], k[0], k[1]))
+    stores: dict[str, int] = {}
+    channels: dict[str, int] = {}
+    published, duration = array("q"), array("I")
+    channel_col, store_col = array("I"), array("H")
+    ids, titles = [], []
+    for vid, store in order:
+        ts, seconds, channel, title = rows[(vid, store)]
+        published.append(ts)
+        duration.append(seconds)
+        channel_col.append(channels.setdefault(channel, len(channels)))
+        store_col.append(stores.setdefault(store, len(stores)))
+        ids.append(vid)
+        titles.append(title)
+    by_duration = array("I", sorted(range(len(order)), key=lambda r: (duration[r], r)))
+    ids_bin, ids_off = _string_table(ids)
+    titles_bin, titles_off = _string_table(titles)
+
+    store_dir.mkdir(parents=True, exist_ok=True)
+    columns = {
+        "published": published, "duration": duration, "channel": channel_col, "store": store_col,
+        "by_duration": by_duration, "ids_off": ids_off, "titles_off": titles_off,
+    }
+    changed = 0
+    for name, (filename, _) in _COLUMNS.items():
+        changed += _write_if_changed(store_dir / filename, columns[name].tobytes())
+    changed += _write_if_changed(store_dir / "ids.bin", ids_bin)
+    changed += _write_if_changed(store_dir / "titles.bin", titles_bin)
+    # meta 最後寫：讀取端看到新的 rows 時，欄位檔已經都到位
+    meta = {"version": STORE_FORMAT_VERSION, "byteorder": sys.byteorder, "rows": len(order),
+            "stores": list(stores), "channels": list(channels)}
+    changed += _write_if_changed(store_dir / "meta.json",
+                                 (json.dumps(meta, ensure_ascii=False, indent=2) + "\n").encode("utf-8"))
+    return changed
+
+
+# -----------------------
+# 主程式
+# -----------------------
+def main():
+    root = Path(__file__).resolve().parent.parent
+    ap = argparse.ArgumentParser(description="YouTube 影片欄式歷史庫")
+    ap.add_argument("--store-dir", default=str(root / "data" / "youtube_store"))
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="把 youtube.json 併進歷史庫")
+    build.add_argument("--data", default=str(root / "data" / "youtube.json"))
+
+    query = sub.add_parser("query", help="依日期 / 長度 / 超商查詢，每筆一行 JSON")
+    query.add_argument("--since", help="publishedAt >= 這個時間（ISO 8601）")
+    query.add_argument("--until", help="publishedAt < 這個時間（ISO 8601）")
+    query.add_argument("--store")
+    query.add_argument("--min-duration", help="最短長度（秒或 m:ss）")
+    query.add_argument("--max-duration", help="最長長度（秒或 m:ss）")
+    query.add_argument("--limit", type=int, default=20)
+    query.add_argument("--longest", action="store_true", help="依長度由長到短，而不是依日期由新到舊")
+    args = ap.parse_args()
+
+    if args.command == "build":
+        data = json.loads(Path(args.data).read_text(encoding="utf-8-sig"))
+        changed = update_video_store(Path(args.store_dir), data)
+        with VideoStore(Path(args.store_dir)) as vs:
+            print(f"OK: {args.store_dir} ({len(vs)} rows, {len(vs.channels)} channels; {changed} files changed)")
+        return
+
+    parse = lambda s: parse_display_duration(s) if s else None  # noqa: E731
+    with VideoStore(Path(args.store_dir)) as vs:
+        if args.longest:
+            rows = vs.longest(args.limit, store=args.store, start=args.since, end=args.until)
+        else:
+            rows = vs.query(args.since, args.until, store=args.store, min_seconds=parse(args.min_duration),
+                            max_seconds=parse(args.max_duration), limit=args.limit)
+    for r in rows:
+        print(json.dumps(r, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
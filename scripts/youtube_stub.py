@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import sys
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import fetch_youtube as fy  # noqa: E402
+
+
+# -----------------------
+# 離線 YouTube Data API 替身（測試 / 壓測用）
+# - --fixtures DIR：重播 fetch_youtube.py --cache-dir 存下的回應（以 request_key 對應）
+#   videos.list 不存回應，改由同一個快取資料夾的 videos.json 逐支回答
+# - --from-data FILE：直接用現有的 youtube.json 合成 search / videos 回應
+#   （search 的 q 對回 STORE_QUERIES 的店家；videos 依 id 回傳）
+# - 支援 keep-alive，fetch_youtube 的連線池在這裡也會被沿用
+# - 每個回應帶 ETag，If-None-Match 相符時回 304（測條件式請求用）
+# -----------------------
+def _iso_duration(display: str) -> str:
+    parts = [int(x) for x in display.split(":")]
+    while len(parts) < 3:
+        parts.insert(0, 0)
+    h, m, s = parts
+    return f"PT{h}H{m}M{s}S" if h else f"PT{m}M{s}S"
+
+
+def synthesize_from_data(data: dict[str, list[dict]]) -> tuple[dict, dict]:
+    # 回傳 (query → search 結果的 videoId 清單, videoId → videos.list item)
+    by_query: dict[str, list[str]] = {}
+    videos: dict[str, dict] = {}
+    for store, entries in data.items():
+        ids = []
+        for v in entries:
+            vid = fy.video_id_from_url(v["url"])
+            if not vid:
+                continue
+            ids.append(vid)
+            videos[vid] = {
+                "kind": "youtube#video",
+                "id": vid,
+                "snippet": {"title": v["title"], "channelTitle": v["channel"], "publishedAt": v["publishedAt"]},
+                "contentDetails": {"duration": _iso_duration(v["duration"])},
+            }
+        by_query[fy.STORE_QUERIES.get(store, store)] = ids
+    return by_query, videos
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    server_version = "YouTubeStub/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, payload: dict | None, headers: dict | None = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else b""
+        headers = dict(headers or {})
+        if status == HTTPStatus.OK:
+            # 錄製檔沒有 ETag 時用 body 的 hash；客戶端帶對 If-None-Match 就回 304
+            etag = headers.setdefault("ETag", '"' + hashlib.sha256(body).hexdigest()[:32] + '"')
+            if self.headers.get("If-None-Match") == etag:
+                status, body = HTTPStatus.NOT_MODIFIED, b""
+                with self.server.stats_lock:
+                    self.server.not_modified += 1
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        endpoint = url.path.rstrip("/").rsplit("/", 1)[-1]
+        params = dict(parse_qsl(url.query))
+        with self.server.stats_lock:
+            self.server.hits[endpoint] = self.server.hits.get(endpoint, 0) + 1
+
+        if self.server.fixtures is not None and endpoint != "videos":
+            fixture = self.server.fixtures.get(fy.request_key(endpoint, params))
+            if fixture is None:
+                return self._send(HTTPStatus.NOT_FOUND, {"error": {"message": "沒有錄到這個請求"}})
+            headers = {"ETag" if k == "etag" else k.title(): v for k, v in fixture.get("headers", {}).items()}
+            return self._send(HTTPStatus.OK, fixture["body"], headers)
+
+        if endpoint == "search":
+            ids = self.server.by_query.get(params.get("q", ""), [])[:int(params.get("maxResults", 5))]
+            items = [{"kind": "youtube#searchResult", "id": {"kind": "youtube#video", "videoId": vid},
+                      "snippet": self.server.videos[vid]["snippet"]} for vid in ids]
+            return self._send(HTTPStatus.OK, {"kind": "youtube#searchListResponse", "items": items})
+        if endpoint == "videos":
+            ids = [vid for vid in params.get("id", "").split(",") if vid in self.server.videos]
+            return self._send(HTTPStatus.OK, {"kind": "youtube#videoListResponse",
+                                              "items": [self.server.videos[vid] for vid in ids]})
+        self._send(HTTPStatus.NOT_FOUND, {"error": {"message": f"unknown endpoint {endpoint}"}})
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, *, fixtures_dir: Path | None = None, data: dict | None = None,
+                 verbose: bool = False):
+        super().__init__(address, StubHandler)
+        self.verbose = verbose
+        self.stats_lock = threading.Lock()
+        self.hits: dict[str, int] = {}
+        self.not_modified = 0
+        self.fixtures = None
+        if fixtures_dir is not None:
+            # 也接受 fetch_youtube.py --cache-dir 整個資料夾（回應在 responses/ 底下）
+            fixtures_dir = Path(fixtures_dir)
+            if (fixtures_dir / "responses").is_dir():
+                fixtures_dir = fixtures_dir / "responses"
+            self.fixtures = {}
+            for path in fixtures_dir.glob("*.json"):
+                fixture = json.loads(path.read_text(encoding="utf-8"))
+                self.fixtures[fixture["request"]] = fixture
+        self.by_query, self.videos = synthesize_from_data(data or {})
+        if fixtures_dir is not None:
+            videos_path = fixtures_dir.parent / "videos.json"
+            if videos_path.exists():
+                self.videos.update(json.loads(videos_path.read_text(encoding="utf-8")))
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="離線 YouTube Data API 替身")
+    src = ap.add_mutually_exclusive_group(required=True)
+    src.add_argument("--fixtures", help="fetch_youtube.py --cache-dir 的資料夾（或其中的 responses/）")
+    src.add_argument("--from-data", help="用現有的 youtube.json 合成回應")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8766)
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args()
+
+    data = None
+    if args.from_data:
+        data = json.loads(Path(args.from_data).read_text(encoding="utf-8"))
+    server = StubServer((args.host, args.port), fixtures_dir=Path(args.fixtures) if args.fixtures else None,
+                        data=data, verbose=args.verbose)
+    print(f"YouTube stub listening on {server.base_url}（fetch_youtube.py --api-base {server.base_url}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()